@@ -0,0 +1,38 @@
+import argparse
+from pathlib import Path
+
+import pandas as pd
+
+from fvhdata.utils.constants import INTERIM, PROCESSED
+from fvhdata.utils.diurnal import DiurnalCube
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build or update diurnal profile cubes from the sensor data")
+    parser.add_argument("--parquet-in", type=Path, default=INTERIM.joinpath("data_all.parquet"), help="Sensor data")
+    parser.add_argument("--output-dir", type=Path, default=PROCESSED, help="Directory for the cube files")
+    parser.add_argument("--measurements", nargs="+", default=["temperature", "humidity"])
+    parser.add_argument("--rebuild", action="store_true", help="Ignore existing cubes and start from scratch")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    df = pd.read_parquet(args.parquet_in)
+
+    for measurement in args.measurements:
+        cube_path = args.output_dir.joinpath(f"diurnal_{measurement}.npz")
+        if cube_path.exists() and not args.rebuild:
+            cube = DiurnalCube.load(cube_path)
+            # Only add the rows that arrived after the previous update of each sensor
+            new_rows = cube.new_rows(df)
+        else:
+            cube = DiurnalCube(measurement)
+            new_rows = df
+        cube.update(new_rows)
+        cube.save(cube_path)
+        print(f"{measurement}: added {len(new_rows)} rows, {len(cube.sensors)} sensors -> {cube_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ import argparse
 from pathlib import Path
 
 from fvhdata.utils.geojson import combine_geojson
+from fvhdata.utils.instrumentation import Tracer, file_size, set_tracer, stage
 from fvhdata.utils.parquet import combine_parquet
 
 
@@ -11,6 +12,9 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--geojson-out", type=Path, help="Path for combined GeoJSON output file")
     parser.add_argument("--parquet-in", nargs="+", type=Path, help="List of input Parquet files")
     parser.add_argument("--parquet-out", type=Path, help="Path for combined Parquet output file")
+    parser.add_argument("--trace", type=Path, help="Write stage timings here (*.trace.json for Chrome trace format)")
+    parser.add_argument("--profile", action="store_true", help="Run cProfile for every stage")
+    parser.add_argument("--trace-memory", action="store_true", help="Run tracemalloc for every stage")
     args = parser.parse_args()
 
     # Check that at least one input/output pair is provided
@@ -22,11 +26,14 @@ def parse_args() -> argparse.Namespace:
 
 def main():
     args = parse_args()
+    profile_dir = args.trace.parent if args.trace else None
+    tracer = set_tracer(Tracer(profile=args.profile, trace_memory=args.trace_memory, profile_dir=profile_dir))
 
     # GeoJSON processing
     if args.geojson_in and args.geojson_out:
         # Use combine_geojson directly and convert to JSON
-        combine_geojson(args.geojson_in, args.geojson_out)
+        with stage("combine_geojson", bytes_read=file_size(args.geojson_in)) as record:
+            record.rows_out = len(combine_geojson(args.geojson_in, args.geojson_out))
         print(f"GeoJSON files combined: {args.geojson_out}")
 
     # Parquet processing
@@ -35,9 +42,14 @@ def main():
         args.parquet_out.parent.mkdir(parents=True, exist_ok=True)
 
         # Combine Parquet files using the utility function
-        combine_parquet(args.parquet_in, args.parquet_out)
+        with stage("combine_parquet", bytes_read=file_size(args.parquet_in)) as record:
+            record.rows_out = len(combine_parquet(args.parquet_in, args.parquet_out))
         print(f"Parquet files combined: {args.parquet_out}")
 
+    tracer.print_summary()
+    if args.trace:
+        tracer.write(args.trace)
+
 
 if __name__ == "__main__":
     main()
@@ -1,21 +1,18 @@
+from pathlib import Path
+
 import pandas as pd
 from ydata_profiling import ProfileReport
 
 from fvhdata.utils.constants import INTERIM, REPORTS
+from fvhdata.utils.executor import map_devices
+from fvhdata.utils.instrumentation import configure_from_env, file_size, stage
 
 
-merged_parquet_path = INTERIM.joinpath("data_all.parquet")
-df = pd.read_parquet(merged_parquet_path)
-# Move the index to a "time" column, so it can be referenced
-# in the "sortby" parameter of ProfileReport.
-df = df.reset_index()
-
-out_dir = REPORTS.joinpath("ydata-profiling")
-out_dir.mkdir(parents=True, exist_ok=True)
-
-for i, sensor_name in enumerate(df["dev-id"].unique(), start=1):
-    print(f"\nCreating sensor analysis report {i}/{df['dev-id'].nunique()}")
-    sensor_data = df.loc[df["dev-id"] == sensor_name, df.columns.drop("dev-id")]
+def create_report(sensor_name: str, sensor_data: pd.DataFrame, out_dir: Path) -> Path:
+    """Create a ydata-profiling report of one sensor and return its path."""
+    # Move the index to a "time" column, so it can be referenced
+    # in the "sortby" parameter of ProfileReport.
+    sensor_data = sensor_data.reset_index()
 
     # Keep only part of the data to speed up the processing
     sensor_data = sensor_data.tail(10_000)
@@ -28,5 +25,33 @@ for i, sensor_name in enumerate(df["dev-id"].unique(), start=1):
     # Automatically identify time-series variables cia "tsmode" parameter.
     # Chronologically order the time-series via "sortby" parameter.
     profile = ProfileReport(sensor_data, tsmode=True, sortby="time", title=f"Time-series EDA of sensor {sensor_name}")
+    path = out_dir.joinpath(f"report_timeseries_{sensor_name}.html")
+    profile.to_file(path)
+    return path
+
+
+def main():
+    # Set FVHDATA_TRACE=reports/reports.trace.json to record stage timings
+    tracer = configure_from_env()
+
+    merged_parquet_path = INTERIM.joinpath("data_all.parquet")
+    with stage("read parquet", bytes_read=file_size(merged_parquet_path)) as record:
+        df = pd.read_parquet(merged_parquet_path)
+        record.rows_out = len(df)
+
+    out_dir = REPORTS.joinpath("ydata-profiling")
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    # One report per sensor, in parallel; set FVHDATA_SERIAL=1 to run them one at a time
+    with stage("profile reports", rows_in=len(df)):
+        results = map_devices(create_report, df, kwargs={"out_dir": out_dir})
+    failed = [result.key for result in results if not result.ok]
+    print(f"Created {len(results) - len(failed)}/{len(results)} sensor analysis reports in {out_dir}")
+    if failed:
+        print(f"Failed: {', '.join(failed)}")
+
+    tracer.print_summary()
+
 
-    profile.to_file(out_dir.joinpath(f"report_timeseries_{sensor_name}.html"))
+if __name__ == "__main__":
+    main()
@@ -5,29 +5,31 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import sys
 
+from fvhdata.utils import alignment
+from fvhdata.utils.alignment import align_to_grid
+from fvhdata.utils.cache import memoize
 
+
+@memoize(depends=[alignment])
 def load_and_prepare_data(file_path):
     """
     Load sensor data and prepare it for clustering analysis
     """
     # Read the parquet file
     df = pd.read_parquet(file_path)
-    # Take df.index as time column
-    df["time"] = df.index
-    # Filter out measurements outside of 2024-07-01 and 2024-08 -31
-    df = df[(df["time"] >= "2024-07-01") & (df["time"] <= "2024-08-31")]
 
-    # Convert time column to datetime if not already in datetime format
-    # if not pd.api.types.is_datetime64_any_dtype(df['time']):
-    #    df['time'] = pd.to_datetime(df['time'])
+    # Snap the jittered timestamps of measurements between 2024-07-01 and 2024-08-31
+    # to a common 10 minute grid, so that each row holds one reading per sensor
+    grid = align_to_grid(df, freq="10min", start="2024-07-01", end="2024-08-31")
 
-    # Pivot the data to get sensors as columns
-    temp_df = df.pivot(index="time", columns="dev-id", values="temperature").reset_index()
-    humid_df = df.pivot(index="time", columns="dev-id", values="humidity").reset_index()
+    # Sensors as columns, NaN where a sensor has no reading for the slot
+    temp_df = grid.to_frame("temperature").reset_index()
+    humid_df = grid.to_frame("humidity").reset_index()
 
     return temp_df, humid_df
 
 
+@memoize
 def calculate_sensor_features(temp_df, humid_df):
     """
     Calculate statistical features for each sensor
@@ -1,79 +1,110 @@
+import datetime
+from typing import List, Tuple
+
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from datetime import timedelta
-
-
-def load_data():
-    # Load sensor data from parquet file
-    df = pd.read_parquet("../data/interim/data_all.parquet")
-    return df
-
-
-def main():
-    st.title("Sensor Data Comparison")
-
-    # Load data
-    df = load_data()
-
-    # Get unique sensor IDs
-    sensor_ids = sorted(df["dev-id"].unique())
-
-    # Create layout with columns
-    col1, col2 = st.columns(2)
-
-    # Sensor selection
-    with col1:
-        sensor1 = st.selectbox("Select first sensor", sensor_ids, key="sensor1")
-
-    with col2:
-        sensor2 = st.selectbox("Select second sensor", sensor_ids, key="sensor2")
-
-    # Measurement type selection
-    measurement_type = st.selectbox("Select measurement type", ["temperature", "humidity"])
-
-    # Date range selection
-    col3, col4 = st.columns(2)
-
-    with col3:
-        start_date = st.date_input("Start date", df.index.min().date())
+import plotly.graph_objects as go
+import pyarrow.compute as pc
+
+from fvhdata.utils.constants import INTERIM
+from fvhdata.utils.instrumentation import configure_from_env, flush, stage
+from fvhdata.utils.store import SensorStore
+
+
+# Set FVHDATA_TRACE=reports/streamlit2.trace.json to record stage timings of every rerun
+configure_from_env()
+
+PARQUET_PATH = INTERIM.joinpath("data_all.parquet")
+
+# The computation is split into cached stages, each keyed only by the inputs it depends on:
+#   store (file) -> sensor list (file)
+#                -> hourly series (file, sensor, measurement, date range)
+#                   -> merged pair (both series) -> figure
+# The selectors and the results are rendered in a fragment, so changing a selector reruns
+# only the fragment, and only the stages whose inputs changed are recomputed.
+
+
+@st.cache_resource(max_entries=1)
+def get_store(path: str, version: int) -> SensorStore:
+    """Open the Parquet file once per version (modification time), shared by all sessions."""
+    with stage("load_data") as record:
+        store = SensorStore(path)
+        record.rows_out = store.table.num_rows
+    return store
+
+
+def current_store() -> SensorStore:
+    return get_store(str(PARQUET_PATH), PARQUET_PATH.stat().st_mtime_ns)
+
+
+@st.cache_data(max_entries=4)
+def sensor_list(path: str, version: int) -> Tuple[List[str], datetime.date, datetime.date]:
+    """Return the sensor ids and the first and last date of the data."""
+    store = get_store(path, version)
+    first, last = pc.min_max(store.table.column(store.time_column)).values()
+    return store.devices, first.as_py().date(), last.as_py().date()
+
+
+@st.cache_data(max_entries=256)
+def hourly_series(
+    path: str, version: int, sensor: str, measurement: str, start: datetime.date, end: datetime.date
+) -> pd.Series:
+    """Return hourly averages of one sensor's measurement from the start date to the end date (inclusive)."""
+    store = get_store(path, version)
+    start_datetime = pd.Timestamp(start).tz_localize("UTC")
+    end_datetime = pd.Timestamp(end).tz_localize("UTC") + pd.Timedelta(days=1)  # Include the end date
+    with stage("hourly series", sensor=sensor, measurement=measurement) as record:
+        table = store.series(sensor, start_datetime, end_datetime, resolution="1h", columns=[measurement])
+        record.rows_out = table.num_rows
+    return store.to_pandas(table)[measurement]
+
+
+@st.cache_data(max_entries=64)
+def merged_pair(
+    path: str,
+    version: int,
+    sensor1: str,
+    sensor2: str,
+    measurement: str,
+    start: datetime.date,
+    end: datetime.date,
+) -> pd.DataFrame:
+    """Return the hours where both sensors have data, with the hour of day for coloring."""
+    data1_hourly = hourly_series(path, version, sensor1, measurement, start, end)
+    data2_hourly = hourly_series(path, version, sensor2, measurement, start, end)
+    with stage("merge", rows_in=len(data1_hourly) + len(data2_hourly)):
+        # Create merged dataset for scatter plot
+        merged_data = pd.DataFrame(
+            {f"{measurement}_sensor1": data1_hourly, f"{measurement}_sensor2": data2_hourly}
+        ).dropna()  # Remove any hours where either sensor has no data
 
-    with col4:
-        end_date = st.date_input("End date", df.index.max().date())
-
-    # Convert dates to datetime
-    start_datetime = pd.to_datetime(start_date)
-    end_datetime = pd.to_datetime(end_date) + timedelta(days=1)  # Include the end date
-
-    print(start_datetime, end_datetime)
-    # Make sure start_datetime and end_datetime are timezone aware
-    start_datetime = start_datetime.tz_localize("UTC")
-    end_datetime = end_datetime.tz_localize("UTC")
-    # Filter data based on selection and calculate hourly averages
-    data1 = df[df["dev-id"] == sensor1].loc[start_datetime:end_datetime]
-    data2 = df[df["dev-id"] == sensor2].loc[start_datetime:end_datetime]
-
-    # Resample to hourly averages
-    data1_hourly = data1[measurement_type].resample("1h").mean()
-    data2_hourly = data2[measurement_type].resample("1h").mean()
-
-    # Create merged dataset for scatter plot
-    merged_data = pd.DataFrame(
-        {f"{measurement_type}_sensor1": data1_hourly, f"{measurement_type}_sensor2": data2_hourly}
-    ).dropna()  # Remove any hours where either sensor has no data
-
-    if not merged_data.empty:
         # Lisätään aikaleima indeksistä omaksi sarakkeeksi tooltippiä varten
         merged_data["timestamp"] = merged_data.index.strftime("%Y-%m-%d %H:%M")
 
         # Lisätään tuntitieto värikoodausta varten
         merged_data["hour"] = merged_data.index.hour
-
+    return merged_data
+
+
+@st.cache_data(max_entries=64)
+def comparison_figure(
+    path: str,
+    version: int,
+    sensor1: str,
+    sensor2: str,
+    measurement: str,
+    start: datetime.date,
+    end: datetime.date,
+) -> go.Figure:
+    merged_data = merged_pair(path, version, sensor1, sensor2, measurement, start, end)
+    x, y = f"{measurement}_sensor1", f"{measurement}_sensor2"
+    with stage("figure", rows_in=len(merged_data)):
         # Päivitetty scatter plot
         fig = px.scatter(
             merged_data,
-            x=f"{measurement_type}_sensor1",
-            y=f"{measurement_type}_sensor2",
+            x=x,
+            y=y,
             color="hour",  # Värikoodaus tunnin mukaan
             color_continuous_scale=[
                 [0.0, "darkblue"],  # 00:00
@@ -83,11 +114,11 @@ def main():
                 [1.0, "darkblue"],  # 24:00
             ],
             labels={
-                f"{measurement_type}_sensor1": f"{sensor1} {measurement_type}",
-                f"{measurement_type}_sensor2": f"{sensor2} {measurement_type}",
+                x: f"{sensor1} {measurement}",
+                y: f"{sensor2} {measurement}",
                 "hour": "Time of day",  # Väripalkin otsikko
             },
-            title=f"Comparison of hourly average {measurement_type} measurements",
+            title=f"Comparison of hourly average {measurement} measurements",
             hover_data=["timestamp"],
         )
 
@@ -107,12 +138,8 @@ def main():
         )
 
         # Add identity line
-        min_val = min(
-            merged_data[f"{measurement_type}_sensor1"].min(), merged_data[f"{measurement_type}_sensor2"].min()
-        )
-        max_val = max(
-            merged_data[f"{measurement_type}_sensor1"].max(), merged_data[f"{measurement_type}_sensor2"].max()
-        )
+        min_val = min(merged_data[x].min(), merged_data[y].min())
+        max_val = max(merged_data[x].max(), merged_data[y].max())
         fig.add_scatter(
             x=[min_val, max_val],
             y=[min_val, max_val],
@@ -120,28 +147,68 @@ def main():
             name="Identity line",
             line=dict(dash="dash", color="gray"),
         )
+    return fig
+
+
+def show_statistics(merged_data: pd.DataFrame, measurement: str):
+    # Display basic statistics
+    st.subheader("Basic Statistics (Hourly Averages)")
+    col5, col6 = st.columns(2)
+    x, y = f"{measurement}_sensor1", f"{measurement}_sensor2"
+
+    with col5:
+        st.metric(f"Average {measurement} (Sensor 1)", f"{merged_data[x].mean():.1f}")
+        st.metric("Number of hours", len(merged_data))
 
+    with col6:
+        st.metric(f"Average {measurement} (Sensor 2)", f"{merged_data[y].mean():.1f}")
+        correlation = merged_data[x].corr(merged_data[y])
+        st.metric("Correlation", f"{correlation:.3f}")
+
+
+@st.fragment
+def comparison(path: str, version: int):
+    sensor_ids, first_date, last_date = sensor_list(path, version)
+    measurements = ["temperature", "humidity"] + get_store(path, version).derived
+
+    # Create layout with columns
+    col1, col2 = st.columns(2)
+
+    # Sensor selection
+    with col1:
+        sensor1 = st.selectbox("Select first sensor", sensor_ids, key="sensor1")
+
+    with col2:
+        sensor2 = st.selectbox("Select second sensor", sensor_ids, key="sensor2")
+
+    # Measurement type selection
+    measurement_type = st.selectbox("Select measurement type", measurements)
+
+    # Date range selection
+    col3, col4 = st.columns(2)
+
+    with col3:
+        start_date = st.date_input("Start date", first_date)
+
+    with col4:
+        end_date = st.date_input("End date", last_date)
+
+    args = (path, version, sensor1, sensor2, measurement_type, start_date, end_date)
+    merged_data = merged_pair(*args)
+    if not merged_data.empty:
         # Display the plot
-        st.plotly_chart(fig)
-
-        # Display basic statistics
-        st.subheader("Basic Statistics (Hourly Averages)")
-        col5, col6 = st.columns(2)
-
-        with col5:
-            st.metric(
-                f"Average {measurement_type} (Sensor 1)", f"{merged_data[f'{measurement_type}_sensor1'].mean():.1f}"
-            )
-            st.metric("Number of hours", len(merged_data))
-
-        with col6:
-            st.metric(
-                f"Average {measurement_type} (Sensor 2)", f"{merged_data[f'{measurement_type}_sensor2'].mean():.1f}"
-            )
-            correlation = merged_data[f"{measurement_type}_sensor1"].corr(merged_data[f"{measurement_type}_sensor2"])
-            st.metric("Correlation", f"{correlation:.3f}")
+        st.plotly_chart(comparison_figure(*args))
+        show_statistics(merged_data, measurement_type)
     else:
         st.warning("No overlapping data found for the selected sensors and time period.")
+    flush()
+
+
+def main():
+    st.title("Sensor Data Comparison")
+
+    store = current_store()
+    comparison(str(store.path), store.mtime_ns)
 
 
 if __name__ == "__main__":
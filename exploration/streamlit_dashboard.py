@@ -1,10 +1,14 @@
-from datetime import timedelta
-
 import streamlit as st
 import pandas as pd
 import altair as alt
 
+from fvhdata.utils.cache import memoize
 from fvhdata.utils.constants import INTERIM
+from fvhdata.utils.instrumentation import configure_from_env, flush, stage
+
+
+# Set FVHDATA_TRACE=reports/dashboard.trace.json to record stage timings of every rerun
+configure_from_env()
 
 
 def app_title():
@@ -17,12 +21,16 @@ def app_title():
     )
 
 
-@st.cache_data(ttl=timedelta(hours=1))
 def load_data(parquet_path):
     return pd.read_parquet(parquet_path)
 
 
-def aggregate_data(df):
+@memoize(depends=[load_data])
+def aggregate_data(parquet_path):
+    # Cached on disk by the file's path, size and modification time, so a rerun doesn't load
+    # the full data, and a regenerated file is aggregated again
+    with stage("load_data"):
+        df = load_data(parquet_path)
     return df.groupby("dev-id").median().reset_index()
 
 
@@ -100,8 +108,9 @@ def main():
     # st.set_page_config(layout="wide")
     app_title()
 
-    df = load_data(INTERIM.joinpath("data_all.parquet"))
-    aggregated = aggregate_data(df)
+    with stage("aggregate_data") as record:
+        aggregated = aggregate_data(INTERIM.joinpath("data_all.parquet"))
+        record.rows_out = len(aggregated)
 
     selected_ids, min_temp, max_temp, min_humidity, max_humidity = add_sidebar_filters(aggregated)
     filtered_data = filter_data(aggregated, selected_ids, min_temp, max_temp, min_humidity, max_humidity)
@@ -111,6 +120,7 @@ def main():
         st.altair_chart(create_altair_chart(filtered_data))
     else:
         st.warning("No data matches the selected filters. Adjust the filters to display the plot.")
+    flush()
 
 
 if __name__ == "__main__":
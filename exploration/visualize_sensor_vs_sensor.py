@@ -1,10 +1,15 @@
 import pandas as pd
 import numpy as np
+import matplotlib
+
+matplotlib.use("Agg")
 from matplotlib import pyplot as plt
+from matplotlib.figure import Figure
 import argparse
 from pathlib import Path
 
 from fvhdata.utils.constants import INTERIM, FIGURES
+from fvhdata.utils.figures import FigureJob, render_figures
 
 # https://matplotlib.org/stable/gallery/style_sheets/style_sheets_reference.html
 plt.style.use("ggplot")
@@ -18,6 +23,8 @@ def parse_arguments():
         "--sensor-pairs", nargs="+", default=["6619,6635"], help='Comma-separated sensor ID pairs (e.g., "6619,6635")'
     )
     parser.add_argument("--output-dir", type=Path, default=FIGURES, help="Output directory for figures")
+    parser.add_argument("--workers", type=int, help="Number of rendering processes (default: number of CPUs)")
+    parser.add_argument("--force", action="store_true", help="Re-render figures even if their inputs are unchanged")
     return parser.parse_args()
 
 
@@ -35,8 +42,7 @@ def create_comparison_plot(
     sensor_type: str,
     start: str,
     end: str,
-    output_dir: Path,
-) -> None:
+) -> Figure:
     """Create comparison scatter plot with additional statistics."""
     fig, ax = plt.subplots(figsize=(12, 10))
     x = sensor1_data[sensor_type]
@@ -44,8 +50,8 @@ def create_comparison_plot(
 
     # Add time-based coloring
     times = sensor1_data.index.hour
-    scatter = plt.scatter(x=x, y=y, c=times, alpha=0.5, cmap="twilight")
-    plt.colorbar(scatter, label="Hour of day")
+    scatter = ax.scatter(x=x, y=y, c=times, alpha=0.5, cmap="twilight")
+    fig.colorbar(scatter, ax=ax, label="Hour of day")
 
     # Add identity line
     ax.plot([0, 1], [0, 1], transform=ax.transAxes, ls="--", c="black", label="1:1 line")
@@ -79,10 +85,8 @@ def create_comparison_plot(
         f"{sensor1_label} vs. {sensor2_label}\nSensor type: {sensor_type}\nTimeframe: [{start}, {end}]",
         fontsize=fontsize,
     )
-    plt.tight_layout()
-    plt.show()
-    plt.savefig(output_dir.joinpath(f"sensor_vs_sensor_{sensor_type}_{sensor1_label}_{sensor2_label}.png"))
-    plt.close()
+    fig.tight_layout()
+    return fig
 
 
 def main():
@@ -103,6 +107,7 @@ def main():
     }
 
     # Process each sensor pair
+    jobs = []
     for pair in args.sensor_pairs:
         sensor1_id, sensor2_id = pair.split(",")
 
@@ -113,17 +118,29 @@ def main():
         sensor2_data = pre_process_time_series(sensor2_data, args.start, args.end)
 
         for sensor_type in ["temperature", "humidity"]:
-            create_comparison_plot(
-                sensor1_data,
-                sensor2_data,
-                sensor_mapping[sensor1_id],
-                sensor_mapping[sensor2_id],
-                sensor_type,
-                args.start,
-                args.end,
-                args.output_dir,
+            sensor1_label = sensor_mapping[sensor1_id]
+            sensor2_label = sensor_mapping[sensor2_id]
+            jobs.append(
+                FigureJob(
+                    plot_func=create_comparison_plot,
+                    # Only the plotted column is hashed, so a change in the other one doesn't invalidate the figure
+                    data=(sensor1_data[[sensor_type]], sensor2_data[[sensor_type]]),
+                    params=dict(
+                        sensor1_label=sensor1_label,
+                        sensor2_label=sensor2_label,
+                        sensor_type=sensor_type,
+                        start=args.start,
+                        end=args.end,
+                    ),
+                    output_path=args.output_dir.joinpath(
+                        f"sensor_vs_sensor_{sensor_type}_{sensor1_label}_{sensor2_label}.png"
+                    ),
+                )
             )
 
+    rendered = render_figures(jobs, max_workers=args.workers, force=args.force)
+    print(f"Rendered {sum(rendered.values())} figures, {len(rendered) - sum(rendered.values())} unchanged")
+
 
 if __name__ == "__main__":
     main()
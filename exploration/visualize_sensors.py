@@ -1,7 +1,7 @@
 import pandas as pd
 import matplotlib
 
-matplotlib.use("TkAgg")
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 import matplotlib.cm as cm
 
@@ -29,5 +29,4 @@ plt.title("Average temperature vs. average humidity for each sensor")
 plt.xlabel("Average temperature")
 plt.ylabel("Average humidity")
 plt.tight_layout()
-plt.show()
 plt.savefig(FIGURES.joinpath("average_temperature_humidity_per_sensor.png"))
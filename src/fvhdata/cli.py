@@ -0,0 +1,136 @@
+"""Command line interface: ``fvhdata <command> ...``."""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from fvhdata.utils.constants import INTERIM, PROCESSED
+
+
+def _write_result(reader, output: Path) -> None:
+    """Stream record batches to a file whose format is chosen by its suffix."""
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+
+    suffix = output.suffix.lower()
+    output.parent.mkdir(parents=True, exist_ok=True)
+    if suffix == ".parquet":
+        with pq.ParquetWriter(output, reader.schema, compression="zstd") as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+    elif suffix == ".csv":
+        with pacsv.CSVWriter(output, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+    elif suffix in (".arrow", ".arrows", ".ipc"):
+        with pa.OSFile(str(output), "wb") as sink, pa.ipc.new_stream(sink, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+    else:
+        raise ValueError(f"Unsupported output format {suffix!r}, use .parquet, .csv or .arrow")
+
+
+def sql_command(args: argparse.Namespace) -> None:
+    from fvhdata.utils.sql import connect, query_batches
+
+    sql = args.query
+    if sql == "-":
+        sql = sys.stdin.read()
+    elif Path(sql).suffix == ".sql" and Path(sql).is_file():
+        sql = Path(sql).read_text()
+
+    con = connect(parquet=args.parquet, fmi=args.fmi, geojson=args.geojson, threads=args.threads)
+    if args.output:
+        _write_result(query_batches(sql, con), args.output)
+        print(f"Query result written: {args.output}", file=sys.stderr)
+    else:
+        con.sql(sql).show(max_rows=args.max_rows)
+
+
+def export_geojson_command(args: argparse.Namespace) -> None:
+    from fvhdata.utils.export import export_geojson
+    from fvhdata.utils.store import SensorStore
+
+    store = None
+    while True:
+        started = time.monotonic()
+        try:
+            # Keep the loaded store between runs; reload it only when the Parquet file changes
+            if store is None or args.parquet.stat().st_mtime_ns != store.mtime_ns:
+                store = SensorStore(args.parquet)
+            written = export_geojson(
+                store, args.geojson, args.output_dir, per_sensor=not args.no_per_sensor, contact=args.contact
+            )
+            print(
+                f"{sum(written.values())}/{len(written)} GeoJSON files updated in {args.output_dir}", file=sys.stderr
+            )
+        except (OSError, ValueError) as exc:
+            if not args.every:
+                raise
+            # e.g. the Parquet file is being rewritten; try again on the next round
+            print(f"Export failed: {exc}", file=sys.stderr)
+        if not args.every:
+            return
+        try:
+            time.sleep(max(0.0, args.every * 60 - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            return
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="fvhdata", description="Tools for the FVH sensor data")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sql = subparsers.add_parser(
+        "sql",
+        help="Run SQL against the sensor data",
+        description="Tables: sensor_data, sensor_hourly, fmi_observations, sensor_metadata, sensor_hourly_meta",
+    )
+    sql.add_argument("query", help="SQL query, a .sql file or - to read from stdin")
+    sql.add_argument(
+        "--parquet",
+        nargs="+",
+        type=Path,
+        default=[INTERIM.joinpath("data_all.parquet")],
+        help="Sensor Parquet file(s)",
+    )
+    sql.add_argument("--fmi", nargs="+", type=Path, help="FMI observation CSV file(s)")
+    sql.add_argument("--geojson", nargs="+", type=Path, help="Sensor metadata GeoJSON file(s)")
+    sql.add_argument("--threads", type=int, help="Number of threads (default: all cores)")
+    sql.add_argument("--output", type=Path, help="Write the result to a .parquet, .csv or .arrow file")
+    sql.add_argument("--max-rows", type=int, default=40, help="Rows to print when no output file is given")
+    sql.set_defaults(func=sql_command)
+
+    export = subparsers.add_parser(
+        "export-geojson",
+        help="Export the latest measurements as GeoJSON",
+        description="Write <name>_latest.geojson collections and per-sensor <dev-id>.geojson files",
+    )
+    export.add_argument("geojson", nargs="+", type=Path, help="Sensor metadata GeoJSON file(s), e.g. *_latest.geojson")
+    export.add_argument(
+        "--parquet", type=Path, default=INTERIM.joinpath("data_all.parquet"), help="Sensor Parquet file"
+    )
+    export.add_argument("--output-dir", type=Path, default=PROCESSED.joinpath("geojson"), help="Output directory")
+    export.add_argument("--no-per-sensor", action="store_true", help="Only write the collection files")
+    export.add_argument("--contact", help="Contact in the collection metadata (default: from the input file)")
+    export.add_argument(
+        "--every",
+        type=float,
+        metavar="MINUTES",
+        help="Keep running and export every MINUTES minutes, reusing the loaded data until the Parquet file changes",
+    )
+    export.set_defaults(func=export_geojson_command)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = get_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Alignment of jittered sensor readings to a regular time grid.
+
+Raw timestamps jitter by seconds (``00:00:54.271``, ``00:01:21.037``), so
+pivoting the raw data by time gives one mostly empty row per unique
+millisecond. ``align_to_grid`` snaps every reading to the nearest slot of a
+canonical grid (10 minutes by default) if it is within the tolerance, keeping
+the nearest reading when several fall into the same slot. The result is a
+dense time × sensor float32 matrix per measurement plus a validity mask, built
+with integer arithmetic on the epoch timestamps in a single pass over all
+devices.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class AlignedGrid:
+    """Readings of many sensors on a common regular time grid.
+
+    ``values[column][i, j]`` is the reading of ``sensors[j]`` snapped to
+    ``times[i]``; ``valid[i, j]`` is False where no reading was within the
+    tolerance of the slot (a gap). A valid slot can still hold NaN if the
+    reading itself was missing that measurement.
+    """
+
+    start: int
+    step: int
+    sensors: List[str]
+    values: Dict[str, np.ndarray]
+    valid: np.ndarray
+
+    @property
+    def times(self) -> pd.DatetimeIndex:
+        """Grid timestamps (UTC)."""
+        return self._slot_times(np.arange(self.valid.shape[0])).rename("time")
+
+    def bitmask(self) -> np.ndarray:
+        """Return ``valid`` packed to bits along the sensor axis (little bit order)."""
+        return np.packbits(self.valid, axis=1, bitorder="little")
+
+    def coverage(self) -> pd.Series:
+        """Return the fraction of valid slots per sensor."""
+        return pd.Series(self.valid.mean(axis=0), index=pd.Index(self.sensors, name="dev-id"), name="coverage")
+
+    def to_frame(self, column: str) -> pd.DataFrame:
+        """Return one measurement as a time × sensor DataFrame, NaN in gaps."""
+        data = np.where(self.valid, self.values[column], np.nan)
+        return pd.DataFrame(data, index=self.times, columns=pd.Index(self.sensors, name="dev-id"))
+
+    def gaps(self, min_slots: int = 1) -> pd.DataFrame:
+        """Return the runs of consecutive missing slots per sensor.
+
+        Args:
+            min_slots: Only report gaps of at least this many slots
+
+        Returns:
+            DataFrame with columns dev-id, start, end (exclusive) and slots
+        """
+        missing = ~self.valid
+        padded = np.zeros((missing.shape[0] + 2, missing.shape[1]), dtype=np.int8)
+        padded[1:-1] = missing
+        edges = np.diff(padded, axis=0)
+        # Runs start where the padded mask goes 0 -> 1 and end where it goes 1 -> 0; scanning
+        # the transposed array keeps the starts and ends of each sensor in matching order
+        start_sensor, start_slot = np.nonzero(edges.T == 1)
+        _, end_slot = np.nonzero(edges.T == -1)
+        slots = end_slot - start_slot
+        keep = slots >= min_slots
+        return pd.DataFrame(
+            {
+                "dev-id": np.asarray(self.sensors, dtype=object)[start_sensor[keep]],
+                "start": self._slot_times(start_slot[keep]),
+                "end": self._slot_times(end_slot[keep]),
+                "slots": slots[keep],
+            }
+        )
+
+    def _slot_times(self, slots: np.ndarray) -> pd.DatetimeIndex:
+        ns = self.start + self.step * slots.astype(np.int64)
+        return pd.DatetimeIndex(ns.astype("datetime64[ns]")).tz_localize("UTC")
+
+
+def align_to_grid(
+    df: pd.DataFrame,
+    freq: str = "10min",
+    tolerance: Optional[str] = None,
+    columns: Sequence[str] = ("temperature", "humidity"),
+    device_column: str = "dev-id",
+    start: Optional[Union[str, pd.Timestamp]] = None,
+    end: Optional[Union[str, pd.Timestamp]] = None,
+    sensors: Optional[Sequence[str]] = None,
+) -> AlignedGrid:
+    """Snap readings to the nearest slot of a regular grid.
+
+    Args:
+        df: Readings with a DatetimeIndex (naive indexes are treated as UTC)
+        freq: Grid step
+        tolerance: Maximum distance between a reading and its slot; default half
+            of the step, i.e. every reading is assigned to its nearest slot
+        columns: Measurements to align
+        device_column: Column with the sensor ids
+        start: First slot, default the slot nearest to the earliest reading
+        end: Slots end before this time, default just after the slot nearest to
+            the latest reading
+        sensors: Sensor ids and their order in the result, default all sensors
+            in the data, sorted
+
+    Returns:
+        The aligned readings
+    """
+    step = pd.Timedelta(freq).value
+    tol = pd.Timedelta(tolerance).value if tolerance else step // 2
+    index = pd.DatetimeIndex(df.index)
+    index = index.tz_localize("UTC") if index.tz is None else index.tz_convert("UTC")
+    ns = index.as_unit("ns").asi8
+
+    if sensors is None:
+        sensors = sorted(pd.unique(df[device_column]).astype(str))
+    sensors = list(sensors)
+    codes = pd.Index(sensors).get_indexer(df[device_column].astype(str)).astype(np.int64)
+
+    def to_ns(value: Union[str, pd.Timestamp]) -> int:
+        ts = pd.Timestamp(value)
+        return (ts.tz_localize("UTC") if ts.tz is None else ts.tz_convert("UTC")).value
+
+    first = to_ns(start) if start is not None else ((ns.min() + step // 2) // step * step if len(ns) else 0)
+    stop = to_ns(end) if end is not None else ((ns.max() + step // 2) // step * step + step if len(ns) else first)
+    n_slots = max(int(-(-(stop - first) // step)), 0)
+    n_sensors = len(sensors)
+
+    # Nearest slot and the distance to it, in integer nanoseconds
+    slot = (ns - first + step // 2) // step
+    offset = np.abs(ns - (first + slot * step))
+    keep = (codes >= 0) & (slot >= 0) & (slot < n_slots) & (offset <= tol)
+    rows = np.nonzero(keep)[0]
+    cell = slot[rows] * n_sensors + codes[rows]
+
+    # Sort by cell, then distance, and keep the nearest reading of each cell
+    order = np.lexsort((offset[rows], cell))
+    cell_sorted = cell[order]
+    nearest = np.ones(len(order), dtype=bool)
+    nearest[1:] = cell_sorted[1:] != cell_sorted[:-1]
+    chosen_rows = rows[order[nearest]]
+    chosen_cells = cell_sorted[nearest]
+
+    valid = np.zeros(n_slots * n_sensors, dtype=bool)
+    valid[chosen_cells] = True
+    values = {}
+    for column in columns:
+        matrix = np.full(n_slots * n_sensors, np.nan, dtype=np.float32)
+        matrix[chosen_cells] = df[column].to_numpy(dtype=np.float32)[chosen_rows]
+        values[column] = matrix.reshape(n_slots, n_sensors)
+    return AlignedGrid(
+        start=int(first), step=step, sensors=sensors, values=values, valid=valid.reshape(n_slots, n_sensors)
+    )
@@ -0,0 +1,317 @@
+"""Disk-backed memoization of expensive analysis results.
+
+Decorate a function with ``@memoize`` and its results are stored under
+``data/interim/cache`` keyed by the function (including its source code), its
+arguments and the size and modification time of any input files passed as
+arguments. DataFrames, Series and tuples of them are stored as Parquet, other
+results are pickled. The cache is shared by all scripts and the least
+recently used entries are evicted when it grows over its size limit::
+
+    @memoize
+    def load_and_prepare_data(file_path):
+        ...
+
+    load_and_prepare_data(INTERIM.joinpath("data_all.parquet"))
+    print(load_and_prepare_data.cache_info())
+
+Helpers whose code changes the result are listed in ``depends``, so that
+editing them invalidates the cached results too::
+
+    @memoize(depends=[align_to_grid])
+    def load_and_prepare_data(file_path):
+        ...
+"""
+
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from fvhdata.utils.constants import CACHE
+
+
+DEFAULT_MAX_BYTES = 2 * 1024**3
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheInfo:
+    """Hit/miss counters of a memoized function (or of a whole cache)."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    size_bytes: int = 0
+    entries: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def _is_file(value: Union[str, Path]) -> bool:
+    try:
+        return Path(value).is_file()
+    except (OSError, ValueError):
+        return False
+
+
+def fingerprint(value: Any, h: Optional["hashlib._Hash"] = None) -> "hashlib._Hash":
+    """Feed a stable fingerprint of ``value`` into a hash object.
+
+    Paths (and strings naming existing files) are fingerprinted by their
+    resolved path, size and modification time rather than their content.
+    """
+    h = h or hashlib.sha1()
+    if isinstance(value, (str, Path)) and _is_file(value):
+        stat = Path(value).stat()
+        h.update(f"file:{Path(value).resolve()}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    elif isinstance(value, pd.DataFrame):
+        h.update(b"frame:" + repr((list(value.columns), list(value.dtypes.astype(str)))).encode())
+        h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, pd.Series):
+        h.update(b"series:" + repr((value.name, str(value.dtype))).encode())
+        h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        h.update(f"array:{value.dtype}:{value.shape}:".encode())
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        h.update(f"{type(value).__name__}:{len(value)}:".encode())
+        for item in value:
+            fingerprint(item, h)
+    elif isinstance(value, dict):
+        h.update(f"dict:{len(value)}:".encode())
+        for key in sorted(value, key=repr):
+            h.update(repr(key).encode())
+            fingerprint(value[key], h)
+    else:
+        h.update(f"{type(value).__name__}:{value!r}".encode())
+    return h
+
+
+def _source(obj: Union[Callable, ModuleType]) -> str:
+    name = obj.__name__ if isinstance(obj, ModuleType) else f"{obj.__module__}.{obj.__qualname__}"
+    try:
+        return inspect.getsource(obj)
+    except (OSError, TypeError):
+        return name
+
+
+def _function_id(func: Callable, depends: Sequence[Union[Callable, ModuleType]] = ()) -> Tuple[str, str]:
+    """Return a directory-safe name for ``func`` and a hash of its source and the sources of ``depends``."""
+    name = f"{func.__module__}.{func.__qualname__}".replace("<", "").replace(">", "")
+    h = hashlib.sha1(_source(func).encode())
+    for dependency in depends:
+        h.update(b"\0" + _source(dependency).encode())
+    return name, h.hexdigest()
+
+
+class DiskCache:
+    """Directory of cached results with size-bounded LRU eviction.
+
+    Args:
+        directory: Cache directory, created on first write
+        max_bytes: Total size limit; the least recently used entries are removed
+            after a write that exceeds it
+    """
+
+    def __init__(self, directory: Union[str, Path] = CACHE, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.info = CacheInfo()
+        self._lock = threading.Lock()
+
+    def _entry(self, namespace: str, key: str) -> Path:
+        return self.directory.joinpath(namespace, key)
+
+    def get(self, namespace: str, key: str) -> Tuple[bool, Any]:
+        """Return ``(True, value)`` for a cached entry, ``(False, None)`` otherwise."""
+        entry = self._entry(namespace, key)
+        meta_path = entry.joinpath("meta.json")
+        try:
+            meta = json.loads(meta_path.read_text())
+            value = self._load(entry, meta)
+        except (OSError, ValueError, pickle.UnpicklingError) as exc:
+            if entry.exists():
+                logger.warning("Discarding unreadable cache entry %s: %s", entry, exc)
+                shutil.rmtree(entry, ignore_errors=True)
+            with self._lock:
+                self.info.misses += 1
+            return False, None
+        # The meta file's mtime is the entry's last access time for LRU eviction
+        os.utime(meta_path)
+        with self._lock:
+            self.info.hits += 1
+        return True, value
+
+    def put(self, namespace: str, key: str, value: Any) -> None:
+        """Store ``value`` and evict old entries if the cache is over its size limit."""
+        entry = self._entry(namespace, key)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(prefix=".tmp-", dir=entry.parent))
+        try:
+            meta = self._dump(tmp, value)
+            tmp.joinpath("meta.json").write_text(json.dumps(meta, default=str))
+            if entry.exists():
+                shutil.rmtree(entry, ignore_errors=True)
+            os.replace(tmp, entry)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        self.evict()
+
+    @staticmethod
+    def _dump(directory: Path, value: Any) -> Dict[str, Any]:
+        is_tuple = isinstance(value, tuple) and value and all(isinstance(v, (pd.DataFrame, pd.Series)) for v in value)
+        items = list(value) if is_tuple else [value]
+        if all(isinstance(v, (pd.DataFrame, pd.Series)) for v in items):
+            kinds = []
+            try:
+                for i, item in enumerate(items):
+                    if isinstance(item, pd.Series):
+                        kinds.append({"kind": "series", "name": item.name})
+                        item = item.to_frame(name="__series__")
+                    else:
+                        kinds.append({"kind": "frame"})
+                    item.to_parquet(directory.joinpath(f"{i}.parquet"))
+                return {"format": "parquet", "tuple": bool(is_tuple), "items": kinds}
+            except (ValueError, TypeError, NotImplementedError) as exc:
+                # e.g. non-string column names; fall back to pickle below
+                logger.debug("Can't store result as Parquet, pickling instead: %s", exc)
+        with directory.joinpath("value.pickle").open("wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return {"format": "pickle"}
+
+    @staticmethod
+    def _load(directory: Path, meta: Dict[str, Any]) -> Any:
+        if meta["format"] == "pickle":
+            with directory.joinpath("value.pickle").open("rb") as f:
+                return pickle.load(f)
+        items = []
+        for i, item_meta in enumerate(meta["items"]):
+            item = pd.read_parquet(directory.joinpath(f"{i}.parquet"))
+            if item_meta["kind"] == "series":
+                item = item["__series__"].rename(item_meta["name"])
+            items.append(item)
+        return tuple(items) if meta["tuple"] else items[0]
+
+    def _entries(self) -> Iterable[Tuple[Path, float, int]]:
+        """Yield (entry, last access time, size in bytes) for every complete entry."""
+        if not self.directory.exists():
+            return
+        for namespace in os.scandir(self.directory):
+            if not namespace.is_dir():
+                continue
+            for entry in os.scandir(namespace.path):
+                meta = Path(entry.path).joinpath("meta.json")
+                if entry.name.startswith(".tmp-") or not meta.exists():
+                    continue
+                size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+                yield Path(entry.path), meta.stat().st_mtime, size
+
+    def evict(self) -> int:
+        """Remove least recently used entries until the cache fits ``max_bytes``; return the number removed."""
+        entries: List[Tuple[Path, float, int]] = sorted(self._entries(), key=lambda e: e[1])
+        total = sum(size for _, _, size in entries)
+        removed = 0
+        while entries and total > self.max_bytes:
+            path, _, size = entries.pop(0)
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            removed += 1
+        with self._lock:
+            self.info.evictions += removed
+            self.info.size_bytes = total
+            self.info.entries = len(entries)
+        return removed
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        """Remove all entries, or only those of one namespace."""
+        shutil.rmtree(self.directory.joinpath(namespace) if namespace else self.directory, ignore_errors=True)
+
+
+_default_cache: Optional[DiskCache] = None
+
+
+def get_cache() -> DiskCache:
+    """Return the shared cache under ``data/interim/cache``.
+
+    The size limit can be set in bytes with the ``FVHDATA_CACHE_MAX_BYTES``
+    environment variable, and ``FVHDATA_CACHE=0`` disables memoization.
+    """
+    global _default_cache
+    if _default_cache is None:
+        max_bytes = int(os.environ.get("FVHDATA_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        _default_cache = DiskCache(CACHE, max_bytes=max_bytes)
+    return _default_cache
+
+
+def memoize(
+    func: Optional[Callable] = None,
+    *,
+    cache: Optional[DiskCache] = None,
+    depends: Sequence[Union[Callable, ModuleType]] = (),
+) -> Callable:
+    """Decorator caching a function's results on disk.
+
+    Can be used as ``@memoize`` or ``@memoize(cache=DiskCache(...), depends=[...])``.
+    The wrapped function gets ``cache_info()`` and ``cache_clear()`` methods
+    like ``functools.lru_cache``. Arguments must not be mutated by the
+    function, and results must not depend on anything other than the
+    arguments, the function's own source, the source of the functions or
+    modules in ``depends`` and the files passed in.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        name, source_hash = _function_id(func, depends)
+        signature = inspect.signature(func)
+        info = CacheInfo()
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if os.environ.get("FVHDATA_CACHE", "1") == "0":
+                return func(*args, **kwargs)
+            disk_cache = cache or get_cache()
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = fingerprint(dict(bound.arguments), hashlib.sha1(source_hash.encode())).hexdigest()
+
+            found, value = disk_cache.get(name, key)
+            if found:
+                info.hits += 1
+                logger.debug("Cache hit for %s (%s)", name, key)
+                return value
+            info.misses += 1
+            value = func(*args, **kwargs)
+            try:
+                disk_cache.put(name, key, value)
+            except Exception as exc:
+                # e.g. an unpicklable result, a full disk or a concurrent write of the same entry
+                logger.warning("Could not cache the result of %s: %s", name, exc)
+                return value
+            info.size_bytes, info.entries = disk_cache.info.size_bytes, disk_cache.info.entries
+            info.evictions = disk_cache.info.evictions
+            return value
+
+        wrapper.cache_info = lambda: CacheInfo(**vars(info))  # type: ignore[attr-defined]
+        wrapper.cache_clear = lambda: (cache or get_cache()).clear(name)  # type: ignore[attr-defined]
+        return wrapper
+
+    if func is not None:
+        return decorator(func)
+    return decorator
@@ -0,0 +1,463 @@
+"""Archival compression codec for per-device sensor time series.
+
+Sensor readings come in fixed steps (0.1 °C, 0.5 %RH) at a roughly
+10-minute cadence, which generic Parquet compression doesn't exploit. This
+codec stores each device's chunk column by column, in blocks of
+``BLOCK_SIZE`` rows:
+
+- timestamps: delta-of-delta of the integer ticks (the greatest common unit
+  of the timestamps, e.g. milliseconds), zigzag encoded and bit-packed
+- values on a decimal grid (detected automatically, e.g. tenths): deltas of
+  the integer grid values, zigzag encoded and bit-packed
+- other floats: XOR of consecutive IEEE 754 bit patterns with common trailing
+  zero bits stripped and bit-packed (Gorilla style)
+
+Every block starts with its own anchor values, so any block can be decoded
+without touching the others (``ChunkReader.read_block``). NaNs are kept in a
+validity bitmap. Decoding is lossless: the decoded float64 values compare
+equal to the original ones.
+
+Decoding is vectorized over all blocks of a column: every packed value is
+assembled from the two 64-bit words it spans, and the per-block prefix sums
+(or XORs) are done in one pass over the column with the sums before each
+block subtracted back out.
+
+Run ``python -m fvhdata.utils.codec data/samples/r4c_sample.csv`` to compare
+the codec with Parquet on CSV or Parquet files.
+"""
+
+import argparse
+import io
+import struct
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+
+CHUNK_MAGIC = b"FVHC"
+ARCHIVE_MAGIC = b"FVHA"
+VERSION = 1
+BLOCK_SIZE = 1024
+
+# Candidate decimal grids: a value v is on the grid if round(v * scale) / scale == v
+SCALES = (1, 2, 10, 20, 100, 1000)
+
+KIND_TIME = 0
+KIND_GRID = 1
+KIND_XOR = 2
+
+_CHUNK_HEADER = struct.Struct("<4sBIHI")  # magic, version, rows, columns, block size
+_COLUMN_HEADER = struct.Struct("<BqBI")  # kind, parameter, has mask, number of blocks
+_BLOCK_HEADER = struct.Struct("<IBBqqI")  # rows, bit width, shift, anchor, first delta, payload bytes
+_BLOCK_HEADER_FIELDS = 5  # without the payload size
+_ARCHIVE_ENTRY = struct.Struct("<HQQ")  # name length, offset, length
+
+
+def _zigzag(values: np.ndarray) -> np.ndarray:
+    values = values.astype(np.int64)
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+
+def _unzigzag(values: np.ndarray) -> np.ndarray:
+    values = values.astype(np.uint64, copy=False)
+    return ((values >> np.uint64(1)).view(np.int64)) ^ -((values & np.uint64(1)).view(np.int64))
+
+
+def _bit_width(values: np.ndarray) -> int:
+    return int(values.max()).bit_length() if values.size else 0
+
+
+def _pack(values: np.ndarray, width: int) -> bytes:
+    """Bit-pack unsigned integers using ``width`` bits each."""
+    if width == 0 or values.size == 0:
+        return b""
+    shifts = np.arange(width, dtype=np.uint64)
+    bits = ((values.astype(np.uint64)[:, None] >> shifts) & np.uint64(1)).astype(np.uint8)
+    return np.packbits(bits.ravel(), bitorder="little").tobytes()
+
+
+def _width_masks(widths: np.ndarray) -> np.ndarray:
+    """Return ``2**width - 1`` for widths 0-64."""
+    widths = widths.astype(np.uint64)
+    return np.where(widths >= 64, ~np.uint64(0), (np.uint64(1) << np.minimum(widths, 63)) - np.uint64(1))
+
+
+def _unpack(words: np.ndarray, bit_offsets: np.ndarray, masks: np.ndarray) -> np.ndarray:
+    """Inverse of ``_pack``: read bit fields of up to 64 bits at any bit offsets.
+
+    Args:
+        words: The data as little-endian 64-bit words, with one word of padding at the end
+        bit_offsets: Bit offset of each field
+        masks: ``_width_masks`` of each field's width
+    """
+    index = bit_offsets >> 6
+    shift = (bit_offsets & 63).astype(np.uint64)
+    # A field spans at most two words; shift in two steps so that a zero shift doesn't wrap to 64
+    high = (words[index + 1] << np.uint64(1)) << (np.uint64(63) - shift)
+    return ((words[index] >> shift) | high) & masks
+
+
+def _segmented_cumsum(values: np.ndarray, starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Cumulative sum restarting at every segment start (int64, wrapping like the encoder)."""
+    total = np.cumsum(values)
+    before = np.where(starts > 0, total[np.maximum(starts - 1, 0)], 0)
+    return total - np.repeat(before, counts)
+
+
+def _grid_scale(values: np.ndarray) -> Optional[int]:
+    """Return the smallest scale in SCALES that represents all values exactly, if any."""
+    if np.isinf(values).any():
+        return None
+    finite = values[~np.isnan(values)]
+    for scale in SCALES:
+        grid = np.round(finite * scale)
+        if np.abs(grid).max(initial=0) < 2**52 and np.array_equal(grid / scale, finite):
+            return scale
+    return None
+
+
+def _fill_missing(values: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """Forward-fill invalid positions so that they encode as zero deltas."""
+    if valid.all():
+        return values
+    index = np.where(valid, np.arange(len(values)), 0)
+    np.maximum.accumulate(index, out=index)
+    filled = values[index]
+    filled[~valid & (np.cumsum(valid) == 0)] = 0
+    return filled
+
+
+def _encode_blocks(ints: np.ndarray, kind: int, block_size: int) -> List[bytes]:
+    blocks = []
+    for start in range(0, len(ints), block_size):
+        block = ints[start : start + block_size]
+        anchor = int(block[0]) if kind != KIND_XOR else int(block[0].view(np.int64))
+        first_delta = 0
+        shift = 0
+        if kind == KIND_TIME:
+            deltas = np.diff(block)
+            first_delta = int(deltas[0]) if deltas.size else 0
+            residuals = _zigzag(np.diff(deltas))
+        elif kind == KIND_GRID:
+            residuals = _zigzag(np.diff(block))
+        else:
+            residuals = block[1:] ^ block[:-1]
+            nonzero = residuals[residuals != 0]
+            if nonzero.size:
+                # Number of trailing zero bits shared by all XORs
+                lowest = nonzero & (~nonzero + np.uint64(1))
+                shift = int(np.log2(lowest.astype(np.float64)).min())
+                residuals = residuals >> np.uint64(shift)
+        width = _bit_width(residuals)
+        payload = _pack(residuals, width)
+        blocks.append(_BLOCK_HEADER.pack(len(block), width, shift, anchor, first_delta, len(payload)) + payload)
+    return blocks
+
+
+def _decode_blocks(kind: int, words: np.ndarray, headers: np.ndarray, payload_offsets: np.ndarray) -> np.ndarray:
+    """Decode consecutive blocks of one column into a single integer array.
+
+    Args:
+        kind: Column kind
+        words: The chunk as padded little-endian 64-bit words
+        headers: One row of ``_BLOCK_HEADER`` fields (without the payload size) per block
+        payload_offsets: Byte offset of each block's payload in the chunk
+    """
+    counts, widths, shifts, anchors, first_deltas = headers.T
+    starts = np.cumsum(counts) - counts
+    n = int(counts.sum())
+    if n == 0:
+        return np.zeros(0, dtype=np.uint64 if kind == KIND_XOR else np.int64)
+
+    # Residuals follow the anchor (and for times the first delta) of each block. Fields are read
+    # for every row; the offsets of the first rows point into the block header and are overwritten.
+    skip = 2 if kind == KIND_TIME else 1
+    block = np.repeat(np.arange(len(counts)), counts)
+    base = payload_offsets * 8 - (starts + skip) * widths
+    if not widths.any():
+        residuals = np.zeros(n, dtype=np.uint64)
+    elif (widths == widths[0]).all():
+        residuals = _unpack(words, base[block] + np.arange(n) * widths[0], _width_masks(widths[:1]))
+    else:
+        residuals = _unpack(words, base[block] + np.arange(n) * widths[block], _width_masks(widths)[block])
+
+    if kind == KIND_XOR:
+        xors = residuals << shifts.astype(np.uint64)[block]
+        xors[starts] = anchors.view(np.uint64)
+        accumulated = np.bitwise_xor.accumulate(xors)
+        before = np.where(starts > 0, accumulated[np.maximum(starts - 1, 0)], np.uint64(0))
+        return accumulated ^ np.repeat(before, counts)
+
+    deltas = _unzigzag(residuals)
+    if kind == KIND_TIME:
+        # Delta-of-deltas -> deltas, with each block's first delta in its second row
+        deltas[starts] = 0
+        deltas[starts[counts > 1] + 1] = first_deltas[counts > 1]
+        deltas = _segmented_cumsum(deltas, starts, counts)
+    deltas[starts] = anchors
+    return _segmented_cumsum(deltas, starts, counts)
+
+
+def encode_chunk(times: np.ndarray, columns: Dict[str, np.ndarray], block_size: int = BLOCK_SIZE) -> bytes:
+    """Encode one device's time-sorted readings.
+
+    Args:
+        times: Timestamps as datetime64 or int64 nanoseconds since the epoch (UTC)
+        columns: Measurement name -> float values, same length as ``times``
+        block_size: Rows per independently decodable block
+
+    Returns:
+        The encoded chunk
+
+    Raises:
+        ValueError: If the lengths don't match or the times are not sorted
+    """
+    if isinstance(times, pd.DatetimeIndex):
+        ns = times.as_unit("ns").asi8
+    else:
+        times = np.asarray(times)
+        is_int = np.issubdtype(times.dtype, np.integer)
+        ns = times.astype(np.int64) if is_int else times.astype("datetime64[ns]").view(np.int64)
+    n = len(ns)
+    if any(len(v) != n for v in columns.values()):
+        raise ValueError("All columns must have the same length as times")
+    if n and np.any(np.diff(ns) < 0):
+        raise ValueError("Times must be sorted")
+
+    out = [_CHUNK_HEADER.pack(CHUNK_MAGIC, VERSION, n, len(columns), block_size)]
+
+    # Timestamps in units of their greatest common divisor (e.g. ms for jittered readings)
+    unit = int(np.gcd.reduce(ns)) if n else 1
+    unit = unit or 1
+    blocks = _encode_blocks(ns // unit, KIND_TIME, block_size)
+    out.append(_COLUMN_HEADER.pack(KIND_TIME, unit, 0, len(blocks)))
+    out.extend(blocks)
+
+    for name, values in columns.items():
+        values = np.asarray(values, dtype=np.float64)
+        valid = ~np.isnan(values)
+        scale = _grid_scale(values)
+        filled = _fill_missing(values, valid)
+        if scale is not None:
+            kind, parameter, ints = KIND_GRID, scale, np.round(filled * scale).astype(np.int64)
+        else:
+            kind, parameter, ints = KIND_XOR, 0, filled.view(np.uint64)
+        blocks = _encode_blocks(ints, kind, block_size)
+        encoded_name = name.encode()
+        out.append(struct.pack("<H", len(encoded_name)) + encoded_name)
+        out.append(_COLUMN_HEADER.pack(kind, parameter, int(not valid.all()), len(blocks)))
+        if not valid.all():
+            out.append(np.packbits(valid, bitorder="little").tobytes())
+        out.extend(blocks)
+    return b"".join(out)
+
+
+class ChunkReader:
+    """Random access to the blocks of an encoded chunk.
+
+    Parsing only reads the headers; payloads are decoded on demand.
+    """
+
+    def __init__(self, data: bytes):
+        self.data = memoryview(data)
+        magic, version, self.n_rows, n_columns, self.block_size = _CHUNK_HEADER.unpack_from(self.data, 0)
+        if magic != CHUNK_MAGIC or version != VERSION:
+            raise ValueError("Not an encoded chunk or unsupported version")
+        # As 64-bit words, padded so that the word after the last field exists
+        self._words = np.frombuffer(bytes(self.data) + bytes(16 - len(self.data) % 8), dtype="<u8").astype(np.uint64)
+        offset = _CHUNK_HEADER.size
+        self._columns: Dict[Optional[str], Tuple[int, int, Optional[np.ndarray], np.ndarray, np.ndarray]] = {}
+        for i in range(n_columns + 1):
+            name = None
+            if i > 0:
+                (length,) = struct.unpack_from("<H", self.data, offset)
+                name = bytes(self.data[offset + 2 : offset + 2 + length]).decode()
+                offset += 2 + length
+            kind, parameter, has_mask, n_blocks = _COLUMN_HEADER.unpack_from(self.data, offset)
+            offset += _COLUMN_HEADER.size
+            valid = None
+            if has_mask:
+                mask_bytes = (self.n_rows + 7) // 8
+                valid = np.unpackbits(
+                    np.frombuffer(self.data[offset : offset + mask_bytes], dtype=np.uint8),
+                    count=self.n_rows,
+                    bitorder="little",
+                ).astype(bool)
+                offset += mask_bytes
+            headers, payload_offsets = [], []
+            for _ in range(n_blocks):
+                header = _BLOCK_HEADER.unpack_from(self.data, offset)
+                headers.append(header[:-1])
+                payload_offsets.append(offset + _BLOCK_HEADER.size)
+                offset += _BLOCK_HEADER.size + header[-1]
+            headers = np.array(headers, dtype=np.int64).reshape(n_blocks, _BLOCK_HEADER_FIELDS)
+            self._columns[name] = (kind, parameter, valid, headers, np.array(payload_offsets, dtype=np.int64))
+        self.n_blocks = (self.n_rows + self.block_size - 1) // self.block_size
+
+    @property
+    def columns(self) -> List[str]:
+        return [name for name in self._columns if name is not None]
+
+    def _read(self, name: Optional[str], blocks: slice) -> np.ndarray:
+        """Decode a column over a range of blocks."""
+        kind, parameter, valid, headers, payload_offsets = self._columns[name]
+        ints = _decode_blocks(kind, self._words, headers[blocks], payload_offsets[blocks])
+        if kind == KIND_TIME:
+            return (ints * parameter).astype("datetime64[ns]")
+        values = ints / parameter if kind == KIND_GRID else ints.view(np.float64)
+        if valid is not None:
+            start = (blocks.start or 0) * self.block_size
+            values[~valid[start : start + len(values)]] = np.nan
+        return values
+
+    def read_block(
+        self, block: int, columns: Optional[Sequence[str]] = None
+    ) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Decode one block: ``(times, {column: values})``."""
+        if not 0 <= block < self.n_blocks:
+            raise IndexError(f"Block {block} out of range, the chunk has {self.n_blocks} blocks")
+        columns = self.columns if columns is None else columns
+        blocks = slice(block, block + 1)
+        return self._read(None, blocks), {name: self._read(name, blocks) for name in columns}
+
+    def read(self, columns: Optional[Sequence[str]] = None) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Decode the whole chunk."""
+        columns = self.columns if columns is None else columns
+        blocks = slice(0, self.n_blocks)
+        return self._read(None, blocks), {name: self._read(name, blocks) for name in columns}
+
+
+def decode_chunk(data: bytes, columns: Optional[Sequence[str]] = None) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Decode a chunk produced by ``encode_chunk``: ``(times, {column: values})``."""
+    return ChunkReader(data).read(columns)
+
+
+def encode_frame(df: pd.DataFrame, device_column: str = "dev-id", block_size: int = BLOCK_SIZE) -> Dict[str, bytes]:
+    """Encode a DataFrame with a DatetimeIndex into one chunk per device."""
+    measurements = [c for c in df.columns if c != device_column and pd.api.types.is_numeric_dtype(df[c])]
+    index = pd.DatetimeIndex(df.index)
+    index = index.tz_localize("UTC") if index.tz is None else index.tz_convert("UTC")
+    ns = index.as_unit("ns").asi8
+    codes, devices = pd.factorize(df[device_column])
+    order = np.lexsort((ns, codes))
+    boundaries = np.searchsorted(codes[order], np.arange(len(devices) + 1))
+    values = {c: df[c].to_numpy(dtype=np.float64)[order] for c in measurements}
+    ns = ns[order]
+    chunks = {}
+    for i, device in enumerate(devices):
+        rows = slice(boundaries[i], boundaries[i + 1])
+        chunks[str(device)] = encode_chunk(ns[rows], {c: v[rows] for c, v in values.items()}, block_size)
+    return chunks
+
+
+def decode_frame(chunks: Dict[str, bytes], device_column: str = "dev-id") -> pd.DataFrame:
+    """Inverse of ``encode_frame``; rows are grouped by device in the order of ``chunks``, then sorted by time."""
+    if not chunks:
+        return pd.DataFrame()
+    decoded = [decode_chunk(data) for data in chunks.values()]
+    lengths = [len(times) for times, _ in decoded]
+    # Columns in order of first appearance; devices without a column get NaN
+    names = list(dict.fromkeys(name for _, columns in decoded for name in columns))
+    # Index.take keeps pandas' default string dtype without converting a Python string per row
+    devices = pd.Index([str(device) for device in chunks]).take(np.repeat(np.arange(len(chunks)), lengths))
+    data = {device_column: devices}
+    for name in names:
+        data[name] = np.concatenate(
+            [columns[name] if name in columns else np.full(n, np.nan) for n, (_, columns) in zip(lengths, decoded)]
+        )
+    times = np.concatenate([times for times, _ in decoded])
+    return pd.DataFrame(data, index=pd.DatetimeIndex(times, name="time").tz_localize("UTC"))
+
+
+def write_archive(df: pd.DataFrame, path: Union[str, Path], device_column: str = "dev-id") -> Path:
+    """Write a DataFrame as an archive file with an index of per-device chunks."""
+    chunks = encode_frame(df, device_column)
+    names = [name.encode() for name in chunks]
+    index_size = 8 + sum(_ARCHIVE_ENTRY.size + len(name) for name in names)
+    entries, offset = [], index_size
+    for name, data in zip(names, chunks.values()):
+        entries.append(_ARCHIVE_ENTRY.pack(len(name), offset, len(data)) + name)
+        offset += len(data)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("wb") as f:
+        f.write(ARCHIVE_MAGIC + struct.pack("<I", len(names)))
+        f.write(b"".join(entries))
+        for data in chunks.values():
+            f.write(data)
+    return path
+
+
+def read_archive(
+    path: Union[str, Path], devices: Optional[Sequence[str]] = None, device_column: str = "dev-id"
+) -> pd.DataFrame:
+    """Read an archive file, optionally only some devices (the others are not decoded)."""
+    data = memoryview(Path(path).read_bytes())
+    if bytes(data[:4]) != ARCHIVE_MAGIC:
+        raise ValueError(f"{path} is not a sensor archive file")
+    (n_devices,) = struct.unpack_from("<I", data, 4)
+    offset, chunks = 8, {}
+    for _ in range(n_devices):
+        length, chunk_offset, chunk_length = _ARCHIVE_ENTRY.unpack_from(data, offset)
+        name = bytes(data[offset + _ARCHIVE_ENTRY.size : offset + _ARCHIVE_ENTRY.size + length]).decode()
+        offset += _ARCHIVE_ENTRY.size + length
+        if devices is None or name in devices:
+            chunks[name] = bytes(data[chunk_offset : chunk_offset + chunk_length])
+    return decode_frame(chunks, device_column)
+
+
+def compression_report(df: pd.DataFrame, device_column: str = "dev-id") -> pd.DataFrame:
+    """Compare the codec with uncompressed, Snappy and ZSTD Parquet on the same data.
+
+    The data is sorted by device and time first, so that Parquet gets the same
+    advantage from the ordering as the codec.
+    """
+    df = df.sort_index().sort_values(device_column, kind="stable")
+    rows = []
+    for compression in ("none", "snappy", "zstd"):
+        buffer = io.BytesIO()
+        start = time.perf_counter()
+        df.to_parquet(buffer, compression=None if compression == "none" else compression)
+        encode = time.perf_counter() - start
+        start = time.perf_counter()
+        pd.read_parquet(io.BytesIO(buffer.getvalue()))
+        decode = time.perf_counter() - start
+        size = buffer.tell()
+        rows.append({"format": f"parquet/{compression}", "bytes": size, "encode_s": encode, "decode_s": decode})
+    start = time.perf_counter()
+    chunks = encode_frame(df, device_column)
+    encode = time.perf_counter() - start
+    start = time.perf_counter()
+    decoded = decode_frame(chunks, device_column)
+    decode = time.perf_counter() - start
+    size = sum(len(c) for c in chunks.values())
+    rows.append({"format": "fvhdata codec", "bytes": size, "encode_s": encode, "decode_s": decode})
+    report = pd.DataFrame(rows).set_index("format")
+    report["ratio_vs_zstd"] = report.loc["parquet/zstd", "bytes"] / report["bytes"]
+    report.attrs["rows"] = len(decoded)
+    return report
+
+
+def read_sensor_file(path: Union[str, Path]) -> pd.DataFrame:
+    """Read a sensor CSV (like the samples) or Parquet file indexed by time."""
+    path = Path(path)
+    if path.suffix == ".parquet":
+        return pd.read_parquet(path)
+    return pd.read_csv(path, parse_dates=["time"], index_col="time")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the sensor codec with Parquet")
+    parser.add_argument("files", nargs="+", type=Path, help="Sensor CSV or Parquet files")
+    args = parser.parse_args()
+    df = pd.concat([read_sensor_file(f) for f in args.files])
+    report = compression_report(df)
+    print(f"{report.attrs['rows']} rows")
+    print(report.to_string(float_format=lambda x: f"{x:.4f}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ REPOSITORY_ROOT = Path(__file__).parent.parent.parent.parent
 DATA = REPOSITORY_ROOT.joinpath("data")
 RAW = DATA.joinpath("raw")
 INTERIM = DATA.joinpath("interim")
+CACHE = INTERIM.joinpath("cache")
 PROCESSED = DATA.joinpath("processed")
 
 REPORTS = REPOSITORY_ROOT.joinpath("reports")
@@ -0,0 +1,338 @@
+"""Diurnal and seasonal profile cube.
+
+``DiurnalCube`` accumulates one measurement (e.g. temperature) into cells of
+sensor × month × local hour of day × day type (weekday / weekend). Every cell
+keeps the count, sum and sum of squares of the values and a fixed-width
+histogram, so means, standard deviations and approximate percentiles can be
+read for any combination of cells without going back to the raw data.
+
+Updates are incremental: feed new rows with ``update()`` and save the cube
+with ``save()``. The time of the last reading is kept per sensor, so
+``new_rows()`` also picks up late rows from sensors that lag behind the
+others. An update only touches the cells it has readings for::
+
+    cube = DiurnalCube("temperature").update(pd.read_parquet(INTERIM.joinpath("data_all.parquet")))
+    # Night-time heat island in July: Koivukylä asphalt vs. forest
+    cube.difference("6155", "6080", months=[7], hours=range(0, 5))
+"""
+
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+
+MONTHS = 12
+HOURS = 24
+DAY_TYPES = ("weekday", "weekend")
+
+# Default histogram ranges (min, max, bin width) for the known measurements
+HISTOGRAM_BINS = {
+    "temperature": (-40.0, 50.0, 0.5),
+    "humidity": (0.0, 100.0, 1.0),
+}
+
+Selection = Optional[Union[int, Iterable[int]]]
+
+
+def _as_index(values: Selection, size: int, offset: int = 0) -> np.ndarray:
+    if values is None:
+        return np.arange(size)
+    if isinstance(values, (int, np.integer)):
+        values = [values]
+    index = np.asarray(list(values), dtype=np.intp) - offset
+    if index.size and (index.min() < 0 or index.max() >= size):
+        raise ValueError(f"Selection {list(values)} out of range")
+    return index
+
+
+class DiurnalCube:
+    """Sensor × month × hour × day type aggregates of one measurement.
+
+    Args:
+        measurement: Column to aggregate
+        bins: Histogram (min, max, bin width) used for percentiles; values outside
+            the range are counted in the first / last bin
+        tz: Time zone for the month, hour and day type of each reading
+        device_column: Column with the sensor ids
+    """
+
+    def __init__(
+        self,
+        measurement: str = "temperature",
+        bins: Optional[Tuple[float, float, float]] = None,
+        tz: str = "Europe/Helsinki",
+        device_column: str = "dev-id",
+    ):
+        self.measurement = measurement
+        self.bins = tuple(bins or HISTOGRAM_BINS.get(measurement, (-50.0, 150.0, 1.0)))
+        self.tz = tz
+        self.device_column = device_column
+        low, high, width = self.bins
+        self.n_bins = int(np.ceil((high - low) / width))
+        self.sensors: List[str] = []
+        # Time of the latest reading of each sensor, UTC
+        self.last_times = np.empty(0, dtype="datetime64[ns]")
+        self._sensor_index: Dict[str, int] = {}
+        self.count = np.zeros((0, MONTHS, HOURS, len(DAY_TYPES)), dtype=np.int64)
+        self.total = np.zeros(self.count.shape, dtype=np.float64)
+        self.total_sq = np.zeros(self.count.shape, dtype=np.float64)
+        self.hist = np.zeros(self.count.shape + (self.n_bins,), dtype=np.uint32)
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self.count.shape
+
+    @property
+    def last_time(self) -> Optional[pd.Timestamp]:
+        """Time of the latest reading of any sensor, or None for an empty cube."""
+        if not self.last_times.size:
+            return None
+        return pd.Timestamp(self.last_times.max()).tz_localize("UTC")
+
+    def _grow(self, new_sensors: Sequence[str]) -> None:
+        for sensor in new_sensors:
+            self._sensor_index[sensor] = len(self.sensors)
+            self.sensors.append(sensor)
+        extra = len(new_sensors)
+        pad = [(0, extra)] + [(0, 0)] * (self.count.ndim - 1)
+        self.count = np.pad(self.count, pad)
+        self.total = np.pad(self.total, pad)
+        self.total_sq = np.pad(self.total_sq, pad)
+        self.hist = np.pad(self.hist, pad + [(0, 0)])
+        self.last_times = np.concatenate([self.last_times, np.full(extra, np.datetime64("NaT", "ns"))])
+
+    @staticmethod
+    def _utc_ns(index: pd.Index) -> np.ndarray:
+        """Return a DatetimeIndex as int64 nanoseconds since the epoch (naive indexes are treated as UTC)."""
+        index = pd.DatetimeIndex(index)
+        index = index.tz_localize("UTC") if index.tz is None else index.tz_convert("UTC")
+        return index.as_unit("ns").asi8
+
+    def new_rows(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Return the rows of ``df`` that are later than the last reading of their sensor in the cube.
+
+        Rows of sensors not in the cube are all new.
+        """
+        if not self.sensors:
+            return df
+        last = self.last_times.astype(np.int64)  # NaT is the smallest int64
+        sensor_codes = pd.Index(self.sensors).get_indexer(df[self.device_column].astype(str).to_numpy())
+        after = np.where(sensor_codes >= 0, last[sensor_codes], np.iinfo(np.int64).min)
+        return df[self._utc_ns(df.index) > after]
+
+    def update(self, df: pd.DataFrame) -> "DiurnalCube":
+        """Add readings to the cube.
+
+        Args:
+            df: DataFrame with a DatetimeIndex (naive indexes are treated as UTC),
+                the device column and the measurement column
+
+        Returns:
+            The cube itself, for chaining
+        """
+        values = df[self.measurement].to_numpy(dtype=np.float64)
+        valid = ~np.isnan(values)
+        if not valid.any():
+            return self
+        values = values[valid]
+        index = pd.DatetimeIndex(df.index[valid])
+        index = index.tz_localize("UTC") if index.tz is None else index
+        local = index.tz_convert(self.tz)
+
+        # Map device ids to integer codes, adding unseen sensors to the cube
+        codes, uniques = pd.factorize(df[self.device_column].to_numpy()[valid])
+        uniques = [str(s) for s in uniques]
+        new = [s for s in uniques if s not in self._sensor_index]
+        if new:
+            self._grow(new)
+        sensor_codes = np.array([self._sensor_index[s] for s in uniques], dtype=np.int64)[codes]
+        last = self.last_times.astype(np.int64)
+        np.maximum.at(last, sensor_codes, self._utc_ns(index))
+        self.last_times = last.astype("datetime64[ns]")
+
+        month = local.month.to_numpy(dtype=np.int64) - 1
+        hour = local.hour.to_numpy(dtype=np.int64)
+        day_type = (local.dayofweek.to_numpy() >= 5).astype(np.int64)
+        cell = ((sensor_codes * MONTHS + month) * HOURS + hour) * len(DAY_TYPES) + day_type
+
+        # Aggregate over the compressed ids of the touched cells, then add to those cells only
+        cells, touched = np.unique(cell, return_inverse=True)
+        self.count.reshape(-1)[cells] += np.bincount(touched)
+        self.total.reshape(-1)[cells] += np.bincount(touched, weights=values)
+        self.total_sq.reshape(-1)[cells] += np.bincount(touched, weights=values * values)
+
+        low, _, width = self.bins
+        bin_index = np.clip(np.floor((values - low) / width).astype(np.int64), 0, self.n_bins - 1)
+        hist = np.bincount(touched * self.n_bins + bin_index, minlength=len(cells) * self.n_bins)
+        self.hist.reshape(-1, self.n_bins)[cells] += hist.reshape(len(cells), self.n_bins).astype(np.uint32)
+        return self
+
+    def _sensor(self, sensor: str) -> int:
+        """Return the index of a sensor by its full id or a unique suffix (e.g. "6155")."""
+        if sensor in self._sensor_index:
+            return self._sensor_index[sensor]
+        matches = [i for i, s in enumerate(self.sensors) if s.endswith(sensor)]
+        if len(matches) != 1:
+            raise KeyError(f"Sensor {sensor!r} matches {len(matches)} sensors in the cube")
+        return matches[0]
+
+    def _select(self, array: np.ndarray, sensor: str, months: Selection, hours: Selection, day_types: Selection):
+        return array[self._sensor(sensor)][
+            np.ix_(_as_index(months, MONTHS, offset=1), _as_index(hours, HOURS), _as_index(day_types, 2))
+        ]
+
+    def mean(self) -> np.ndarray:
+        """Return the mean of every cell (NaN for empty cells)."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.total / self.count
+
+    def std(self) -> np.ndarray:
+        """Return the population standard deviation of every cell."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = self.total / self.count
+            return np.sqrt(np.maximum(self.total_sq / self.count - mean * mean, 0.0))
+
+    def _percentiles(self, hist: np.ndarray, q: Sequence[float]) -> np.ndarray:
+        """Interpolate percentiles from histograms along the last axis."""
+        low, _, width = self.bins
+        cumulative = np.cumsum(hist, axis=-1, dtype=np.int64)
+        n = cumulative[..., -1:]
+        result = []
+        for quantile in q:
+            target = quantile * n
+            # First bin where the cumulative count reaches the target
+            position = np.minimum((cumulative < target).sum(axis=-1, keepdims=True), self.n_bins - 1)
+            before = np.where(position > 0, np.take_along_axis(cumulative, np.maximum(position - 1, 0), -1), 0)
+            in_bin = np.take_along_axis(hist, position, -1)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                fraction = np.where(in_bin > 0, (target - before) / in_bin, 0.0)
+                value = low + (position + fraction) * width
+            result.append(np.where(n > 0, value, np.nan)[..., 0])
+        return np.stack(result, axis=-1)
+
+    def percentiles(self, q: Sequence[float] = (0.1, 0.5, 0.9)) -> np.ndarray:
+        """Return approximate percentiles of every cell, shape ``self.shape + (len(q),)``.
+
+        The accuracy is limited by the histogram bin width.
+        """
+        return self._percentiles(self.hist, q)
+
+    def lookup(
+        self,
+        sensor: str,
+        months: Selection = None,
+        hours: Selection = None,
+        day_types: Selection = None,
+        q: Sequence[float] = (0.1, 0.5, 0.9),
+    ) -> Dict[str, float]:
+        """Return pooled statistics over a selection of cells.
+
+        Args:
+            sensor: Sensor id or a unique suffix of it
+            months: Month number(s) 1-12, default all
+            hours: Local hour(s) 0-23, default all
+            day_types: 0 for weekdays, 1 for weekends, default both
+            q: Percentiles to include
+
+        Returns:
+            Dict with count, mean, std and the requested percentiles (keys like "p50")
+        """
+        count = int(self._select(self.count, sensor, months, hours, day_types).sum())
+        total = self._select(self.total, sensor, months, hours, day_types).sum()
+        total_sq = self._select(self.total_sq, sensor, months, hours, day_types).sum()
+        hist = self._select(self.hist, sensor, months, hours, day_types).reshape(-1, self.n_bins).sum(axis=0)
+        stats = {"count": count, "mean": np.nan, "std": np.nan}
+        if count:
+            mean = total / count
+            stats["mean"] = float(mean)
+            stats["std"] = float(np.sqrt(max(total_sq / count - mean * mean, 0.0)))
+        for quantile, value in zip(q, self._percentiles(hist, q)):
+            stats[f"p{quantile * 100:g}"] = float(value)
+        return stats
+
+    def difference(
+        self,
+        sensor_a: str,
+        sensor_b: str,
+        months: Selection = None,
+        hours: Selection = None,
+        day_types: Selection = None,
+    ) -> float:
+        """Return the mean of ``sensor_a`` minus the mean of ``sensor_b`` over the selected cells.
+
+        Only cells where both sensors have data are used, and every hour of the
+        selection is weighted equally, so gaps in one sensor don't bias the result.
+        """
+        mean = self.mean()
+        mean_a = self._select(mean, sensor_a, months, hours, day_types)
+        mean_b = self._select(mean, sensor_b, months, hours, day_types)
+        both = ~(np.isnan(mean_a) | np.isnan(mean_b))
+        if not both.any():
+            return np.nan
+        return float((mean_a[both] - mean_b[both]).mean())
+
+    def to_frame(self, q: Sequence[float] = (0.1, 0.5, 0.9)) -> pd.DataFrame:
+        """Return the non-empty cells as a tidy DataFrame."""
+        sensor, month, hour, day_type = np.nonzero(self.count)
+        frame = pd.DataFrame(
+            {
+                "dev-id": np.asarray(self.sensors, dtype=object)[sensor],
+                "month": month + 1,
+                "hour": hour,
+                "day_type": np.asarray(DAY_TYPES, dtype=object)[day_type],
+                "count": self.count[sensor, month, hour, day_type],
+                "mean": self.mean()[sensor, month, hour, day_type],
+                "std": self.std()[sensor, month, hour, day_type],
+            }
+        )
+        percentiles = self.percentiles(q)[sensor, month, hour, day_type]
+        for i, quantile in enumerate(q):
+            frame[f"p{quantile * 100:g}"] = percentiles[:, i]
+        return frame
+
+    def save(self, path: Union[str, Path]) -> Path:
+        """Save the cube as a compressed ``.npz`` file."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("wb") as f:
+            np.savez_compressed(
+                f,
+                measurement=self.measurement,
+                bins=np.asarray(self.bins),
+                tz=self.tz,
+                last_times=self.last_times,
+                device_column=self.device_column,
+                sensors=np.asarray(self.sensors, dtype=str),
+                count=self.count,
+                total=self.total,
+                total_sq=self.total_sq,
+                hist=self.hist,
+            )
+        return path
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "DiurnalCube":
+        """Load a cube saved with ``save()``."""
+        with np.load(path) as data:
+            cube = cls(
+                str(data["measurement"]),
+                bins=tuple(data["bins"].tolist()),
+                tz=str(data["tz"]),
+                device_column=str(data["device_column"]),
+            )
+            cube.sensors = data["sensors"].tolist()
+            if "last_times" in data:
+                cube.last_times = data["last_times"].astype("datetime64[ns]")
+            else:
+                # Cubes saved before per-sensor times: use the overall last time for every sensor
+                last_time = pd.Timestamp(str(data["last_time"])) if str(data["last_time"]) else None
+                fill = np.datetime64("NaT", "ns") if last_time is None else last_time.tz_convert(None).to_datetime64()
+                cube.last_times = np.full(len(cube.sensors), fill, dtype="datetime64[ns]")
+            cube._sensor_index = {s: i for i, s in enumerate(cube.sensors)}
+            cube.count = data["count"]
+            cube.total = data["total"]
+            cube.total_sq = data["total_sq"]
+            cube.hist = data["hist"]
+        return cube
@@ -0,0 +1,312 @@
+"""Run per-sensor analyses in parallel, one task per device or device pair.
+
+Most analyses follow the same pattern: loop over the devices, filter the full
+DataFrame to one device and compute something. ``map_devices`` sorts the data
+by device once, puts each column in shared memory and gives worker processes
+only the offsets of their device's rows, so the data is neither filtered once
+per device nor pickled to every worker::
+
+    def profile(device, data):
+        return data["temperature"].describe()
+
+    for result in map_devices(profile, df):
+        if result.ok:
+            print(result.key, result.value["mean"])
+
+The function must be defined at module level so that it can be pickled. It
+gets the device id and the device's rows (without the device column), and
+its return value must be picklable. An exception in one task doesn't stop
+the others; it is returned as the task's ``error`` with the traceback.
+
+Use ``max_workers=0`` or set ``FVHDATA_SERIAL=1`` to run everything in the
+calling process, e.g. to use a debugger.
+"""
+
+import logging
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+Key = Hashable
+
+
+@dataclass
+class TaskResult:
+    """Result of one task: the function's return value, or the error traceback."""
+
+    key: Key
+    value: Any = None
+    error: Optional[str] = None
+    seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class _Column:
+    """How to rebuild one column of a partition."""
+
+    name: Hashable
+    dtype: str
+    tz: Optional[str] = None
+    shm_name: Optional[str] = None
+    values: Optional[np.ndarray] = None  # columns that can't be shared, e.g. strings
+
+
+class _Partitions:
+    """The data sorted by device, with each column in a shared memory block.
+
+    Args:
+        df: The data
+        device_column: Column with the device ids
+        shared: Put the columns in shared memory; if False, keep them in this process
+    """
+
+    def __init__(self, df: pd.DataFrame, device_column: str, shared: bool = True):
+        self.index_names: List[Hashable] = []
+        if not isinstance(df.index, pd.RangeIndex):
+            self.index_names = list(df.index.names)
+            df = df.reset_index()
+        codes, devices = pd.factorize(df[device_column].astype(str), sort=True)
+        order = np.argsort(codes, kind="stable")
+        boundaries = np.searchsorted(codes[order], np.arange(len(devices) + 1))
+        self.ranges: Dict[str, Tuple[int, int]] = {
+            device: (int(boundaries[i]), int(boundaries[i + 1])) for i, device in enumerate(devices)
+        }
+        self.columns: List[_Column] = []
+        self._blocks: List[shared_memory.SharedMemory] = []
+        self.arrays: Dict[Hashable, np.ndarray] = {}
+        try:
+            for name in df.columns:
+                if name == device_column:
+                    continue
+                self._add_column(name, df[name], order, shared)
+        except BaseException:
+            self.close()
+            raise
+
+    def _add_column(self, name: Hashable, series: pd.Series, order: np.ndarray, shared: bool) -> None:
+        tz = None
+        if isinstance(series.dtype, pd.DatetimeTZDtype):
+            tz = str(series.dtype.tz)
+            values = series.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy(dtype="datetime64[ns]")
+        else:
+            values = series.to_numpy()
+        values = values[order]
+        column = _Column(name=name, dtype=values.dtype.str, tz=tz)
+        if shared and values.dtype.kind in "biufcmM" and values.nbytes:
+            block = shared_memory.SharedMemory(create=True, size=values.nbytes)
+            self._blocks.append(block)
+            np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[:] = values
+            column.shm_name = block.name
+        else:
+            column.values = values
+        self.columns.append(column)
+        self.arrays[name] = values
+
+    def close(self) -> None:
+        """Release the shared memory blocks."""
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+
+def _frame_from_arrays(arrays: Dict[Hashable, np.ndarray], columns: List[_Column], index_names: List) -> pd.DataFrame:
+    """Rebuild a partition DataFrame from its column arrays."""
+    data = {}
+    for column in columns:
+        values = arrays[column.name]
+        data[column.name] = pd.Series(values).dt.tz_localize("UTC").dt.tz_convert(column.tz) if column.tz else values
+    df = pd.DataFrame(data)
+    return df.set_index(index_names) if index_names else df
+
+
+# Worker process state: the column specs and the attached shared memory blocks
+_worker_columns: List[_Column] = []
+_worker_index_names: List = []
+_worker_arrays: Dict[Hashable, np.ndarray] = {}
+_worker_blocks: List[shared_memory.SharedMemory] = []
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    try:
+        # The creating process owns and unlinks the block
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: workers share the parent's resource tracker, so registering again is harmless
+        return shared_memory.SharedMemory(name=name)
+
+
+def _init_worker(columns: List[_Column], index_names: List, length: int) -> None:
+    global _worker_columns, _worker_index_names
+    _worker_columns, _worker_index_names = columns, index_names
+    for column in columns:
+        if column.shm_name:
+            block = _attach(column.shm_name)
+            _worker_blocks.append(block)
+            _worker_arrays[column.name] = np.ndarray((length,), dtype=np.dtype(column.dtype), buffer=block.buf)
+        else:
+            _worker_arrays[column.name] = column.values
+
+
+def _partition(arrays: Dict[Hashable, np.ndarray], columns: List[_Column], index_names: List, rows: Tuple[int, int]):
+    first, last = rows
+    return _frame_from_arrays({name: values[first:last] for name, values in arrays.items()}, columns, index_names)
+
+
+def _call(fn: Callable, key: Key, devices: Sequence[str], row_ranges: Sequence[Tuple[int, int]], args, kwargs):
+    """Run one task in a worker process."""
+    started = time.perf_counter()
+    try:
+        frames = [_partition(_worker_arrays, _worker_columns, _worker_index_names, rows) for rows in row_ranges]
+        value = fn(*devices, *frames, *args, **kwargs)
+        return TaskResult(key, value=value, seconds=time.perf_counter() - started)
+    except Exception:
+        return TaskResult(key, error=traceback.format_exc(), seconds=time.perf_counter() - started)
+
+
+def _report(done: int, total: int, result: TaskResult) -> None:
+    status = f"{result.seconds:.1f} s" if result.ok else "FAILED"
+    print(f"[{done}/{total}] {result.key}: {status}", file=sys.stderr, flush=True)
+
+
+def _run(
+    fn: Callable,
+    df: pd.DataFrame,
+    tasks: Sequence[Tuple[Key, Sequence[str]]],
+    device_column: str,
+    max_workers: Optional[int],
+    progress: bool,
+    args: tuple,
+    kwargs: Optional[dict],
+) -> List[TaskResult]:
+    kwargs = kwargs or {}
+    if max_workers is None:
+        max_workers = 0 if os.environ.get("FVHDATA_SERIAL", "0") == "1" else os.cpu_count() or 1
+    serial = max_workers <= 1 or len(tasks) <= 1
+    partitions = _Partitions(df, device_column, shared=not serial)
+    results: List[Optional[TaskResult]] = [None] * len(tasks)
+
+    def finish(i: int, result: TaskResult) -> None:
+        results[i] = result
+        if not result.ok:
+            logger.warning("Task %s failed:\n%s", result.key, result.error)
+        if progress:
+            _report(sum(r is not None for r in results), len(tasks), result)
+
+    try:
+        row_ranges = [[partitions.ranges[device] for device in devices] for _, devices in tasks]
+        if serial:
+            global _worker_columns, _worker_index_names, _worker_arrays
+            _worker_columns, _worker_index_names = partitions.columns, partitions.index_names
+            _worker_arrays = partitions.arrays
+            try:
+                for i, ((key, devices), rows) in enumerate(zip(tasks, row_ranges)):
+                    finish(i, _call(fn, key, devices, rows, args, kwargs))
+            finally:
+                _worker_columns, _worker_index_names, _worker_arrays = [], [], {}
+        else:
+            # The worker gets the specs without the values of shared columns
+            specs = [
+                _Column(c.name, c.dtype, c.tz, c.shm_name, None if c.shm_name else c.values)
+                for c in partitions.columns
+            ]
+            length = len(df)
+            with ProcessPoolExecutor(
+                max_workers=min(max_workers, len(tasks)),
+                initializer=_init_worker,
+                initargs=(specs, partitions.index_names, length),
+            ) as executor:
+                futures = {
+                    executor.submit(_call, fn, key, devices, rows, args, kwargs): i
+                    for i, ((key, devices), rows) in enumerate(zip(tasks, row_ranges))
+                }
+                for future in as_completed(futures):
+                    i = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception:
+                        # The worker died or the result couldn't be pickled
+                        result = TaskResult(tasks[i][0], error=traceback.format_exc())
+                    finish(i, result)
+    finally:
+        partitions.close()
+    return results  # type: ignore[return-value]
+
+
+def map_devices(
+    fn: Callable[..., Any],
+    df: pd.DataFrame,
+    devices: Optional[Sequence[str]] = None,
+    device_column: str = "dev-id",
+    max_workers: Optional[int] = None,
+    progress: bool = True,
+    args: tuple = (),
+    kwargs: Optional[dict] = None,
+) -> List[TaskResult]:
+    """Call ``fn(device, data, *args, **kwargs)`` for every device, in parallel.
+
+    Args:
+        fn: Module-level function taking a device id and its rows
+        df: The data of all devices
+        devices: Devices to process, in this order; default all, sorted
+        device_column: Column with the device ids
+        max_workers: Number of worker processes, default the number of CPUs;
+            0 or 1 runs the tasks serially in this process
+        progress: Print a line to stderr as each task finishes
+        args: Extra positional arguments to ``fn``
+        kwargs: Extra keyword arguments to ``fn``
+
+    Returns:
+        One ``TaskResult`` per device, keyed by the device id, in the order of ``devices``
+
+    Raises:
+        KeyError: If a requested device isn't in the data
+    """
+    all_devices = sorted(pd.unique(df[device_column].astype(str)))
+    devices = list(devices) if devices is not None else all_devices
+    missing = set(devices) - set(all_devices)
+    if missing:
+        raise KeyError(f"Devices not in the data: {sorted(missing)}")
+    tasks = [(device, [device]) for device in devices]
+    return _run(fn, df, tasks, device_column, max_workers, progress, args, kwargs)
+
+
+def map_pairs(
+    fn: Callable[..., Any],
+    df: pd.DataFrame,
+    pairs: Sequence[Tuple[str, str]],
+    device_column: str = "dev-id",
+    max_workers: Optional[int] = None,
+    progress: bool = True,
+    args: tuple = (),
+    kwargs: Optional[dict] = None,
+) -> List[TaskResult]:
+    """Call ``fn(device_a, device_b, data_a, data_b, *args, **kwargs)`` for every pair, in parallel.
+
+    Results are keyed by the ``(device_a, device_b)`` tuple and in the order of
+    ``pairs``. See ``map_devices`` for the other arguments.
+
+    Raises:
+        KeyError: If a device of a pair isn't in the data
+    """
+    all_devices = set(pd.unique(df[device_column].astype(str)))
+    missing = {device for pair in pairs for device in pair} - all_devices
+    if missing:
+        raise KeyError(f"Devices not in the data: {sorted(missing)}")
+    tasks = [(tuple(pair), list(pair)) for pair in pairs]
+    return _run(fn, df, tasks, device_column, max_workers, progress, args, kwargs)
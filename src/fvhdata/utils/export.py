@@ -0,0 +1,282 @@
+"""Export the latest measurements as GeoJSON files, like the published open data.
+
+Two kinds of files are produced from sensor metadata GeoJSON and a
+``SensorStore``:
+
+- ``<name>_latest.geojson``: a FeatureCollection with the metadata of each
+  sensor and its latest ``measurement`` (time in Finnish local time)
+- ``<dev-id>.geojson``: one Feature per sensor with the metadata, the latest
+  ``measurement`` and ``data`` arrays of the latest raw readings (``raw``),
+  3-hour means (``h3``) and daily means (``d1``), times in UTC
+
+The raw readings and the rollups of all sensors are computed in a few
+vectorized passes over the store's device index (``SensorStore.latest`` and
+``SensorStore.rollup``). Collections are serialized and written one feature
+at a time. Files are replaced atomically, and only if their content changed;
+the ``created_at`` time of a collection doesn't count as a change::
+
+    store = SensorStore(INTERIM.joinpath("data_all.parquet"))
+    written = export_geojson(store, [RAW.joinpath("r4c_latest.geojson")], PROCESSED.joinpath("geojson"))
+"""
+
+import datetime
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from fvhdata.utils.store import SensorStore
+
+
+LOCAL_TZ = "Europe/Helsinki"
+
+# Name: (bin size, number of bins)
+RESOLUTIONS = {"h3": ("3h", 14), "d1": ("1D", 4)}
+RAW_READINGS = 8
+ROUNDING = {"temperature": 2, "humidity": 1}
+COLUMNS = ("humidity", "temperature")
+
+# Properties of the published files that are replaced on export
+DATA_PROPERTIES = ("measurement", "data")
+
+FEATURES_MARKER = '\n "features": ['
+
+
+def read_features(path: Union[str, Path]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Read the ``meta`` object and the features of a GeoJSON file, without measurement data.
+
+    Raises:
+        FileNotFoundError: If the file doesn't exist
+    """
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"File not found: {path}")
+    with path.open() as f:
+        collection = json.load(f)
+    features = collection["features"] if collection.get("type") == "FeatureCollection" else [collection]
+    for feature in features:
+        properties = feature.get("properties") or {}
+        feature["properties"] = {k: v for k, v in properties.items() if k not in DATA_PROPERTIES}
+    return collection.get("meta", {}), features
+
+
+def _records(table: pa.Table, time_column: str, columns: Sequence[str], time_unit: str) -> List[Dict[str, Any]]:
+    """Convert a table to a list of {"time": ..., <column>: ...} dicts with rounded values."""
+    # Unsafe cast: truncate sub-microsecond detail instead of raising
+    times = table.column(time_column).cast(pa.timestamp("us", tz="UTC"), safe=False).to_numpy(zero_copy_only=False)
+    fields = [[t + "+00:00" for t in np.datetime_as_string(times, unit=time_unit)]]
+    for column in columns:
+        values = table.column(column).to_numpy(zero_copy_only=False).astype(np.float64)
+        values = np.round(values, ROUNDING.get(column, 2))
+        fields.append([None if v != v else v for v in values.tolist()])
+    keys = ["time", *columns]
+    return [dict(zip(keys, row)) for row in zip(*fields)]
+
+
+def _split_by_device(table: pa.Table, device_column: str) -> Dict[str, pa.Table]:
+    """Split a table ordered by device into per-device tables (zero-copy slices)."""
+    devices = table.column(device_column).to_numpy(zero_copy_only=False)
+    if len(devices) == 0:
+        return {}
+    starts = np.flatnonzero(np.r_[True, devices[1:] != devices[:-1]])
+    ends = np.r_[starts[1:], len(devices)]
+    return {devices[s]: table.slice(s, e - s) for s, e in zip(starts, ends)}
+
+
+def sensor_data(
+    store: SensorStore,
+    devices: Optional[Sequence[str]] = None,
+    columns: Sequence[str] = COLUMNS,
+    raw: int = RAW_READINGS,
+    resolutions: Dict[str, Tuple[str, int]] = RESOLUTIONS,
+) -> Dict[str, Dict[str, Any]]:
+    """Return the ``measurement`` and ``data`` properties of each device that has data.
+
+    Args:
+        store: The sensor data
+        devices: Device ids, default all devices in the store; unknown ids are skipped
+        columns: Measurement columns to include
+        raw: Number of latest raw readings
+        resolutions: Rollups to include, name: (bin size, number of bins)
+
+    Returns:
+        Dict of device id: {"measurement": {...}, "data": {"raw": [...], <name>: [...]}}
+    """
+    if devices is not None:
+        devices = [d for d in devices if d in store.devices]
+    columns = list(columns)
+    tables = {"raw": store.latest(raw, devices, columns)}
+    for name, (resolution, periods) in resolutions.items():
+        tables[name] = store.rollup(resolution, periods, devices, columns)
+
+    result: Dict[str, Dict[str, Any]] = {}
+    for name, table in tables.items():
+        time_unit = "us" if name == "raw" else "s"
+        for device, device_table in _split_by_device(table, store.device_column).items():
+            entry = result.setdefault(device, {"measurement": None, "data": {}})
+            entry["data"][name] = _records(device_table, store.time_column, columns, time_unit)
+    for device, entry in result.items():
+        latest = dict(entry["data"]["raw"][-1])
+        ts = pd.Timestamp(latest["time"]).tz_convert(LOCAL_TZ)
+        latest["time"] = ts.to_pydatetime().isoformat(timespec="microseconds")
+        entry["measurement"] = latest
+    return result
+
+
+def _indented(value: Any, level: int) -> str:
+    """Return ``json.dumps(value, indent=1)`` as it appears nested ``level`` levels deep."""
+    return " " * level + json.dumps(value, indent=1).replace("\n", "\n" + " " * level)
+
+
+def iter_feature_collection(meta: Dict[str, Any], features: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """Yield a FeatureCollection as JSON text, one feature at a time.
+
+    The output is the same as ``json.dumps(collection, indent=1)``. The first
+    chunk holds everything before ``"features"``.
+    """
+    yield '{\n "type": "FeatureCollection",\n "meta": ' + _indented(meta, 1).lstrip() + ","
+    yield FEATURES_MARKER
+    for i, feature in enumerate(features):
+        yield ("," if i else "") + "\n" + _indented(feature, 2)
+    yield "\n ]\n}"
+
+
+def _skip_to(f: TextIO, marker: str) -> Optional[str]:
+    """Read ``f`` up to ``marker``; return the text read past its start, or None if it isn't found."""
+    buffer = ""
+    while marker not in buffer:
+        piece = f.read(1 << 16)
+        if not piece:
+            return None
+        buffer += piece
+    return buffer[buffer.index(marker) :]
+
+
+def write_if_changed(path: Union[str, Path], chunks: Iterable[str], compare_from: Optional[str] = None) -> bool:
+    """Stream text to a file atomically, unless the file already has the same content.
+
+    The chunks are written to a temporary file as they come and compared with
+    the existing file on the way; the temporary file replaces it only if they
+    differ.
+
+    Args:
+        path: Output file
+        chunks: The content
+        compare_from: If given, only compare the content from the first occurrence
+            of this string on, e.g. to ignore a creation time in a header
+
+    Returns:
+        True if the file was written
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+    old = path.open() if path.exists() else None
+    try:
+        changed = old is None
+        # Old text read but not compared yet, and new text before compare_from
+        old_pending = ""
+        new_pending: Optional[str] = None
+        if old is not None and compare_from:
+            old_pending = _skip_to(old, compare_from)
+            changed = old_pending is None
+            new_pending = ""
+        with os.fdopen(fd, "w") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                if changed:
+                    continue
+                if new_pending is not None:
+                    new_pending += chunk
+                    if compare_from not in new_pending:
+                        continue
+                    chunk, new_pending = new_pending[new_pending.index(compare_from) :], None
+                expected = old_pending[: len(chunk)]
+                old_pending = old_pending[len(chunk) :]
+                if len(expected) < len(chunk):
+                    expected += old.read(len(chunk) - len(expected))
+                changed = expected != chunk
+        if not changed:
+            changed = new_pending is not None or bool(old_pending) or bool(old.read(1))
+        if changed:
+            # mkstemp creates the file readable only by the owner
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, path)
+        else:
+            Path(tmp).unlink()
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    finally:
+        if old is not None:
+            old.close()
+    return changed
+
+
+def _with_data(feature: Dict[str, Any], device_data: Optional[Dict[str, Any]], full: bool) -> Dict[str, Any]:
+    """Return a copy of the feature with the measurement (and data) properties added."""
+    properties = dict(feature.get("properties") or {})
+    if device_data is not None:
+        properties["measurement"] = device_data["measurement"]
+        if full:
+            properties["data"] = device_data["data"]
+    return {**feature, "properties": properties}
+
+
+def export_geojson(
+    store: SensorStore,
+    metadata_files: Sequence[Union[str, Path]],
+    output_dir: Union[str, Path],
+    per_sensor: bool = True,
+    contact: Optional[str] = None,
+    columns: Sequence[str] = COLUMNS,
+) -> Dict[Path, bool]:
+    """Write the latest collection of each metadata file and the per-sensor files.
+
+    Args:
+        store: The sensor data
+        metadata_files: GeoJSON files with one feature per sensor, e.g. earlier
+            published ``*_latest.geojson`` files; each produces a collection file
+            with the same name in ``output_dir``
+        output_dir: Output directory
+        per_sensor: Also write a ``<dev-id>.geojson`` file for each sensor with data
+        contact: Contact in the collection ``meta``, default the one in the input file
+        columns: Measurement columns to include
+
+    Returns:
+        Dict of output path: True if the file was written, False if unchanged
+
+    Raises:
+        FileNotFoundError: If a metadata file doesn't exist
+    """
+    output_dir = Path(output_dir)
+    collections = [(Path(path), *read_features(path)) for path in metadata_files]
+    ids = [feature.get("id") for _, _, features in collections for feature in features]
+    data = sensor_data(store, [i for i in ids if i], columns)
+
+    created_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    written: Dict[Path, bool] = {}
+    for path, old_meta, features in collections:
+        name = path.stem.removesuffix("_latest")
+        meta = {
+            "created_at": created_at,
+            "comment": f"The latest measurements and the metadata file for the {name} sensors.",
+            "contact": contact or old_meta.get("contact", ""),
+        }
+        latest = (_with_data(feature, data.get(feature.get("id")), full=False) for feature in features)
+        output = output_dir.joinpath(path.name)
+        written[output] = write_if_changed(output, iter_feature_collection(meta, latest), FEATURES_MARKER)
+        if per_sensor:
+            for feature in features:
+                device_data = data.get(feature.get("id"))
+                if device_data is None:
+                    continue
+                output = output_dir.joinpath(f"{feature['id']}.geojson")
+                text = json.dumps(_with_data(feature, device_data, full=True), indent=1)
+                written[output] = write_if_changed(output, [text])
+    return written
@@ -0,0 +1,156 @@
+"""Parallel, cached rendering of matplotlib figures.
+
+A ``FigureJob`` describes one output image: a plotting function returning a
+``matplotlib.figure.Figure``, the data it plots and its keyword arguments.
+``render_figures()`` hashes every job (data, parameters and the source code of
+the plotting function), skips the jobs whose output file was already rendered
+with the same hash and renders the rest in a process pool using the headless
+Agg backend.
+
+The hashes are stored in a ``.figure-cache.json`` manifest in each output directory.
+"""
+
+import hashlib
+import inspect
+import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+
+MANIFEST_NAME = ".figure-cache.json"
+
+
+@dataclass
+class FigureJob:
+    """One figure to render.
+
+    ``plot_func(*data, **params)`` must return a matplotlib Figure. It has to be
+    a module-level function so that it can be sent to the worker processes.
+    """
+
+    plot_func: Callable[..., Any]
+    data: Tuple[Any, ...]
+    output_path: Path
+    params: Dict[str, Any] = field(default_factory=dict)
+    savefig_kwargs: Dict[str, Any] = field(default_factory=dict)
+
+
+def _hash_value(h: "hashlib._Hash", value: Any) -> None:
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+        h.update(repr(list(value.columns) if isinstance(value, pd.DataFrame) else value.name).encode())
+    else:
+        h.update(json.dumps(value, sort_keys=True, default=str).encode())
+
+
+def code_version(func: Callable[..., Any]) -> str:
+    """Return a hash of the source code of ``func`` and the matplotlib version."""
+    import matplotlib
+
+    try:
+        source = inspect.getsource(func)
+    except (OSError, TypeError):
+        source = f"{func.__module__}.{func.__qualname__}"
+    return hashlib.sha1(f"{source}\n{matplotlib.__version__}".encode()).hexdigest()
+
+
+def figure_key(job: FigureJob) -> str:
+    """Return the content hash of a job: input data, parameters and code version."""
+    h = hashlib.sha1()
+    for value in job.data:
+        _hash_value(h, value)
+    _hash_value(h, job.params)
+    _hash_value(h, job.savefig_kwargs)
+    h.update(code_version(job.plot_func).encode())
+    return h.hexdigest()
+
+
+def _read_manifest(directory: Path) -> Dict[str, str]:
+    path = directory.joinpath(MANIFEST_NAME)
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text())
+    except json.JSONDecodeError:
+        return {}
+
+
+def _write_manifest(directory: Path, manifest: Dict[str, str]) -> None:
+    directory.joinpath(MANIFEST_NAME).write_text(json.dumps(manifest, indent=2, sort_keys=True))
+
+
+def _init_worker() -> None:
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+
+def _render(job: FigureJob) -> Path:
+    import matplotlib.pyplot as plt
+
+    fig = job.plot_func(*job.data, **job.params)
+    try:
+        job.output_path.parent.mkdir(parents=True, exist_ok=True)
+        fig.savefig(job.output_path, **job.savefig_kwargs)
+    finally:
+        plt.close(fig)
+    return job.output_path
+
+
+def render_figures(jobs: List[FigureJob], max_workers: Optional[int] = None, force: bool = False) -> Dict[Path, bool]:
+    """Render the figures whose inputs have changed since the previous run.
+
+    Args:
+        jobs: Figures to render
+        max_workers: Size of the process pool, defaults to the number of CPUs;
+            use 1 to render in the current process (e.g. for debugging)
+        force: Render all figures regardless of the cache
+
+    Returns:
+        Dict mapping each output path to True if it was rendered, False if it was a cache hit
+    """
+    manifests: Dict[Path, Dict[str, str]] = {}
+    pending: List[Tuple[FigureJob, str]] = []
+    result: Dict[Path, bool] = {}
+
+    for job in jobs:
+        job.output_path = Path(job.output_path)
+        directory = job.output_path.parent
+        if directory not in manifests:
+            manifests[directory] = _read_manifest(directory)
+        key = figure_key(job)
+        cached = manifests[directory].get(job.output_path.name) == key and job.output_path.exists()
+        if cached and not force:
+            result[job.output_path] = False
+        else:
+            # Forget the old hash until the new image has been written successfully
+            manifests[directory].pop(job.output_path.name, None)
+            pending.append((job, key))
+
+    def done(job: FigureJob, key: str) -> None:
+        manifests[job.output_path.parent][job.output_path.name] = key
+        result[job.output_path] = True
+
+    try:
+        if max_workers == 1 or len(pending) <= 1:
+            _init_worker()
+            for job, key in pending:
+                _render(job)
+                done(job, key)
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as executor:
+                futures = {executor.submit(_render, job): (job, key) for job, key in pending}
+                for future in as_completed(futures):
+                    # Re-raises the first failure; figures finished so far stay cached
+                    future.result()
+                    done(*futures[future])
+    finally:
+        for directory, manifest in manifests.items():
+            directory.mkdir(parents=True, exist_ok=True)
+            _write_manifest(directory, manifest)
+
+    return result
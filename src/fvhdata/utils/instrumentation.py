@@ -0,0 +1,330 @@
+"""Lightweight instrumentation for pipeline stages.
+
+Wrap the stages of a script in ``stage()`` blocks (or decorate functions with
+``timed_stage()``) and write the collected records as JSON or as a Chrome trace
+(open it in ``chrome://tracing`` or https://ui.perfetto.dev)::
+
+    from fvhdata.utils.instrumentation import stage, get_tracer
+
+    with stage("read parquet", bytes_read=file_size(path)) as record:
+        df = pd.read_parquet(path)
+        record.rows_out = len(df)
+
+    get_tracer().write_chrome_trace("reports/trace.json")
+"""
+
+import atexit
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Union
+
+
+DEFAULT_MAX_RECORDS = 10_000
+
+# ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+_MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def peak_rss() -> int:
+    """Return the peak resident set size of the current process in bytes."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_UNIT
+
+
+def file_size(paths: Union[str, Path, List[Union[str, Path]]]) -> int:
+    """Return the total size in bytes of one or more files (missing files count as 0)."""
+    if isinstance(paths, (str, Path)):
+        paths = [paths]
+    return sum(Path(p).stat().st_size for p in paths if Path(p).exists())
+
+
+@dataclass
+class StageRecord:
+    """Measurements of a single stage run.
+
+    ``rows_in``, ``rows_out`` and ``bytes_read`` can be set (or updated) inside
+    the ``stage()`` block, the rest is filled in when the block exits.
+    """
+
+    name: str
+    start: float = 0.0
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    peak_rss_delta: int = 0
+    rows_in: Optional[int] = None
+    rows_out: Optional[int] = None
+    bytes_read: Optional[int] = None
+    tracemalloc_peak: Optional[int] = None
+    profile_path: Optional[str] = None
+    error: Optional[str] = None
+    thread_id: int = 0
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+
+class Tracer:
+    """Collect ``StageRecord``s and write them to disk.
+
+    Args:
+        profile: Run cProfile for every stage unless overridden per stage
+        trace_memory: Run tracemalloc for every stage unless overridden per stage
+        profile_dir: Directory for the ``.prof`` files written by profiled stages
+        max_records: Number of records kept; older ones are dropped, so that a
+            long-running process (e.g. a Streamlit server) doesn't grow without limit
+    """
+
+    def __init__(
+        self,
+        profile: bool = False,
+        trace_memory: bool = False,
+        profile_dir: Optional[Union[str, Path]] = None,
+        max_records: int = DEFAULT_MAX_RECORDS,
+    ):
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+        self.records: Deque[StageRecord] = deque(maxlen=max_records)
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._count = 0
+        # cProfile and tracemalloc are process-wide, so only the outermost stage uses them
+        self._profiling = False
+        self._memory_depth = 0
+
+    @contextmanager
+    def stage(
+        self,
+        name: str,
+        rows_in: Optional[int] = None,
+        bytes_read: Optional[int] = None,
+        profile: Optional[bool] = None,
+        trace_memory: Optional[bool] = None,
+        **extra: Any,
+    ) -> Iterator[StageRecord]:
+        """Measure the enclosed block as a stage called ``name``.
+
+        Args:
+            name: Stage name, shown in the trace
+            rows_in: Number of input rows, if known up front
+            bytes_read: Number of bytes read from disk, if known up front
+            profile: Override the tracer's cProfile setting for this stage
+            trace_memory: Override the tracer's tracemalloc setting for this stage
+            **extra: Additional JSON-serializable values stored with the record
+
+        Yields:
+            The ``StageRecord`` of this run, for setting ``rows_out`` etc.
+
+        Only one stage is profiled at a time: a stage that starts while another
+        one (in any thread) is being profiled isn't profiled itself, but shows up
+        in the outer stage's profile. Likewise the ``tracemalloc_peak`` of a
+        nested stage is the peak since the outermost traced stage started.
+        """
+        record = StageRecord(name=name, rows_in=rows_in, bytes_read=bytes_read, extra=extra)
+        record.thread_id = threading.get_ident()
+        profile = self.profile if profile is None else profile
+        trace_memory = self.trace_memory if trace_memory is None else trace_memory
+
+        profiler = None
+        started_tracemalloc = False
+        with self._lock:
+            if profile and not self._profiling:
+                profiler = cProfile.Profile()
+                self._profiling = True
+            if trace_memory:
+                if self._memory_depth == 0:
+                    if tracemalloc.is_tracing():
+                        tracemalloc.reset_peak()
+                    else:
+                        tracemalloc.start()
+                        started_tracemalloc = True
+                self._memory_depth += 1
+
+        rss_before = peak_rss()
+        cpu_before = time.process_time()
+        record.start = time.perf_counter()
+        if profiler:
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler (e.g. an external tool) is active
+                profiler = None
+                with self._lock:
+                    self._profiling = False
+        try:
+            yield record
+        except BaseException as exc:
+            record.error = f"{type(exc).__name__}: {exc}"
+            raise
+        finally:
+            if profiler:
+                profiler.disable()
+                with self._lock:
+                    self._profiling = False
+            record.wall_time = time.perf_counter() - record.start
+            record.cpu_time = time.process_time() - cpu_before
+            record.peak_rss_delta = peak_rss() - rss_before
+            record.start -= self._origin
+            if trace_memory:
+                record.tracemalloc_peak = tracemalloc.get_traced_memory()[1]
+                with self._lock:
+                    self._memory_depth -= 1
+                if started_tracemalloc:
+                    tracemalloc.stop()
+            if profiler:
+                record.profile_path = self._dump_profile(profiler, name)
+            with self._lock:
+                self.records.append(record)
+                self._count += 1
+
+    def _dump_profile(self, profiler: cProfile.Profile, name: str) -> Optional[str]:
+        if self.profile_dir is None:
+            # Without a directory, log the top functions instead of writing a file
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(15)
+            print(stream.getvalue(), file=sys.stderr)
+            return None
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        safe_name = "".join(c if c.isalnum() or c in "-_" else "_" for c in name)
+        path = self.profile_dir.joinpath(f"{safe_name}-{os.getpid()}-{self._count}.prof")
+        profiler.dump_stats(path)
+        return str(path)
+
+    def _snapshot(self) -> List[StageRecord]:
+        with self._lock:
+            return list(self.records)
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Return the records as a list of dicts."""
+        return [asdict(r) for r in self._snapshot()]
+
+    def write_json(self, path: Union[str, Path]) -> Path:
+        """Write the records as a JSON list."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.summary(), indent=2))
+        return path
+
+    def write_chrome_trace(self, path: Union[str, Path]) -> Path:
+        """Write the records in Chrome Trace Event format (complete events, microseconds)."""
+        events = []
+        for r in self._snapshot():
+            args = {k: v for k, v in asdict(r).items() if k not in ("name", "start", "wall_time", "thread_id")}
+            events.append(
+                {
+                    "name": r.name,
+                    "cat": "stage",
+                    "ph": "X",
+                    "ts": r.start * 1e6,
+                    "dur": r.wall_time * 1e6,
+                    "pid": os.getpid(),
+                    "tid": r.thread_id,
+                    "args": args,
+                }
+            )
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}))
+        return path
+
+    def write(self, path: Union[str, Path]) -> Path:
+        """Write a Chrome trace if ``path`` ends with ``.trace.json``, otherwise a plain JSON list."""
+        if str(path).endswith(".trace.json"):
+            return self.write_chrome_trace(path)
+        return self.write_json(path)
+
+    def print_summary(self, file=None) -> None:
+        """Print a one-line summary per stage (to stderr by default)."""
+        file = file or sys.stderr
+        for r in self._snapshot():
+            rows = f" rows {r.rows_in}->{r.rows_out}" if r.rows_in is not None or r.rows_out is not None else ""
+            print(
+                f"{r.name}: wall {r.wall_time:.3f}s cpu {r.cpu_time:.3f}s "
+                f"peak rss +{r.peak_rss_delta / 2**20:.1f} MiB{rows}",
+                file=file,
+            )
+
+
+_tracer = Tracer()
+_output_path: Optional[Path] = None
+
+
+def get_tracer() -> Tracer:
+    """Return the process-wide default tracer."""
+    return _tracer
+
+
+def set_tracer(tracer: Tracer) -> Tracer:
+    """Replace the process-wide default tracer and return it."""
+    global _tracer
+    _tracer = tracer
+    return tracer
+
+
+def configure_from_env() -> Tracer:
+    """Configure the default tracer from environment variables.
+
+    - ``FVHDATA_TRACE``: output path; records are written there at exit and on ``flush()``
+    - ``FVHDATA_PROFILE=1``: run cProfile for every stage
+    - ``FVHDATA_TRACEMALLOC=1``: run tracemalloc for every stage
+    - ``FVHDATA_PROFILE_DIR``: directory for ``.prof`` files
+
+    Nothing is written when ``FVHDATA_TRACE`` is not set, so scripts can call this
+    unconditionally.
+    """
+    global _output_path
+    tracer = get_tracer()
+    tracer.profile = os.environ.get("FVHDATA_PROFILE", "") == "1"
+    tracer.trace_memory = os.environ.get("FVHDATA_TRACEMALLOC", "") == "1"
+    if os.environ.get("FVHDATA_PROFILE_DIR"):
+        tracer.profile_dir = Path(os.environ["FVHDATA_PROFILE_DIR"])
+    trace_path = os.environ.get("FVHDATA_TRACE")
+    if trace_path and _output_path is None:
+        atexit.register(flush)
+    _output_path = Path(trace_path) if trace_path else None
+    return tracer
+
+
+def flush() -> Optional[Path]:
+    """Write the default tracer's records to the path configured by ``configure_from_env()``."""
+    if _output_path is None:
+        return None
+    return get_tracer().write(_output_path)
+
+
+def stage(name: str, **kwargs: Any):
+    """Measure a block with the default tracer, see ``Tracer.stage``."""
+    return get_tracer().stage(name, **kwargs)
+
+
+def timed_stage(name: Optional[str] = None, **stage_kwargs: Any) -> Callable:
+    """Decorator measuring every call of the function as a stage.
+
+    If the function returns an object with ``__len__`` (e.g. a DataFrame), its
+    length is recorded as ``rows_out``.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        stage_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(stage_name, **stage_kwargs) as record:
+                result = func(*args, **kwargs)
+                if hasattr(result, "__len__"):
+                    record.rows_out = len(result)
+                return result
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,193 @@
+"""Derived meteorological quantities from air temperature and relative humidity.
+
+The IoT sensors report only temperature (°C) and relative humidity (%). This
+module derives:
+
+- ``vapour_pressure``: actual water vapour pressure (hPa)
+- ``dew_point``: dew point temperature (°C), Magnus formula
+- ``absolute_humidity``: water vapour density (g/m³)
+- ``vapour_pressure_deficit``: saturation minus actual vapour pressure (hPa)
+- ``heat_index``: NOAA heat index (°C); where it stays below 80 °F (26.7 °C),
+  Steadman's simple formula is used, which is close to, but not equal to,
+  the air temperature (e.g. 14.8 °C at 15 °C and 86 %RH)
+
+The Magnus coefficients are those recommended by the WMO (Sonntag 1990) for
+saturation over water: ``es = 6.112 * exp(17.62 * T / (243.12 + T))``.
+
+All functions work on float32 arrays in fixed-size chunks with preallocated
+scratch buffers (NumPy ufuncs with ``out=``), so deriving columns for many
+years of fleet data doesn't allocate a temporary per operation and memory
+stays flat::
+
+    derived = derive(df["temperature"], df["humidity"], ["dew_point", "heat_index"])
+"""
+
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+MAGNUS_A = np.float32(17.62)
+MAGNUS_B = np.float32(243.12)  # °C
+MAGNUS_C = np.float32(6.112)  # hPa
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+UNITS = {
+    "vapour_pressure": "hPa",
+    "dew_point": "°C",
+    "absolute_humidity": "g/m³",
+    "vapour_pressure_deficit": "hPa",
+    "heat_index": "°C",
+}
+METRICS = tuple(UNITS)
+
+
+def _magnus_exponent(t: np.ndarray, out: np.ndarray) -> np.ndarray:
+    """out = A * T / (B + T)"""
+    np.add(t, MAGNUS_B, out=out)
+    np.divide(t, out, out=out)
+    np.multiply(out, MAGNUS_A, out=out)
+    return out
+
+
+def _saturation_vapour_pressure(t: np.ndarray, out: np.ndarray) -> np.ndarray:
+    _magnus_exponent(t, out)
+    np.exp(out, out=out)
+    np.multiply(out, MAGNUS_C, out=out)
+    return out
+
+
+def _vapour_pressure(t: np.ndarray, rh: np.ndarray, out: np.ndarray) -> np.ndarray:
+    _saturation_vapour_pressure(t, out)
+    np.multiply(out, rh, out=out)
+    np.multiply(out, np.float32(0.01), out=out)
+    return out
+
+
+def _dew_point(t: np.ndarray, rh: np.ndarray, out: np.ndarray, scratch: np.ndarray) -> np.ndarray:
+    # gamma = ln(RH / 100) + A * T / (B + T); Td = B * gamma / (A - gamma)
+    _magnus_exponent(t, scratch)
+    np.multiply(rh, np.float32(0.01), out=out)
+    # RH 0 gives ln(0) = -inf and -inf / -inf = NaN
+    with np.errstate(divide="ignore", invalid="ignore"):
+        np.log(out, out=out)
+        np.add(out, scratch, out=out)
+        np.subtract(MAGNUS_A, out, out=scratch)
+        np.multiply(out, MAGNUS_B, out=out)
+        np.divide(out, scratch, out=out)
+    return out
+
+
+def _absolute_humidity(t: np.ndarray, rh: np.ndarray, out: np.ndarray, scratch: np.ndarray) -> np.ndarray:
+    # AH = 216.7 * e / (T + 273.15), e in hPa
+    _vapour_pressure(t, rh, out)
+    np.multiply(out, np.float32(216.7), out=out)
+    np.add(t, np.float32(273.15), out=scratch)
+    np.divide(out, scratch, out=out)
+    return out
+
+
+def _vapour_pressure_deficit(t: np.ndarray, rh: np.ndarray, out: np.ndarray, scratch: np.ndarray) -> np.ndarray:
+    # VPD = es * (1 - RH / 100)
+    _saturation_vapour_pressure(t, out)
+    np.multiply(rh, np.float32(-0.01), out=scratch)
+    np.add(scratch, np.float32(1), out=scratch)
+    np.multiply(out, scratch, out=out)
+    return out
+
+
+def _heat_index(t: np.ndarray, rh: np.ndarray) -> np.ndarray:
+    """NOAA heat index (Rothfusz regression with adjustments), computed in °F."""
+    f = t * np.float32(1.8) + np.float32(32)
+    simple = np.float32(0.5) * (f + np.float32(61) + (f - np.float32(68)) * np.float32(1.2) + rh * np.float32(0.094))
+    hi = (
+        np.float32(-42.379)
+        + np.float32(2.04901523) * f
+        + np.float32(10.14333127) * rh
+        - np.float32(0.22475541) * f * rh
+        - np.float32(6.83783e-3) * f * f
+        - np.float32(5.481717e-2) * rh * rh
+        + np.float32(1.22874e-3) * f * f * rh
+        + np.float32(8.5282e-4) * f * rh * rh
+        - np.float32(1.99e-6) * f * f * rh * rh
+    )
+    dry = (rh < 13) & (f >= 80) & (f <= 112)
+    hi[dry] -= ((13 - rh[dry]) / 4) * np.sqrt((17 - np.abs(f[dry] - 95)) / 17)
+    humid = (rh > 85) & (f >= 80) & (f <= 87)
+    hi[humid] += ((rh[humid] - 85) / 10) * ((87 - f[humid]) / 5)
+    # The regression only applies when the simple estimate reaches 80 °F
+    hi = np.where((simple + f) / 2 >= 80, hi, simple)
+    return ((hi - np.float32(32)) / np.float32(1.8)).astype(np.float32)
+
+
+def derive(
+    temperature: Sequence[float],
+    humidity: Sequence[float],
+    metrics: Sequence[str] = METRICS,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Dict[str, np.ndarray]:
+    """Compute derived quantities from temperature (°C) and relative humidity (%).
+
+    Args:
+        temperature: Air temperatures
+        humidity: Relative humidities, 0-100
+        metrics: Names from ``METRICS``
+        chunk_size: Number of values processed at a time
+
+    Returns:
+        Dict of float32 arrays, NaN where either input is NaN
+
+    Raises:
+        ValueError: If an unknown metric is requested or the inputs differ in length
+    """
+    unknown = set(metrics) - set(METRICS)
+    if unknown:
+        raise ValueError(f"Unknown metrics: {sorted(unknown)}")
+    t_all = np.asarray(temperature, dtype=np.float32)
+    rh_all = np.asarray(humidity, dtype=np.float32)
+    if t_all.shape != rh_all.shape:
+        raise ValueError("temperature and humidity must have the same shape")
+
+    n = t_all.size
+    results = {m: np.empty(n, dtype=np.float32) for m in metrics}
+    scratch_buffer = np.empty(min(chunk_size, n), dtype=np.float32)
+    for start in range(0, n, chunk_size):
+        t = t_all.ravel()[start : start + chunk_size]
+        rh = rh_all.ravel()[start : start + chunk_size]
+        scratch = scratch_buffer[: len(t)]
+        for metric in metrics:
+            out = results[metric][start : start + len(t)]
+            if metric == "vapour_pressure":
+                _vapour_pressure(t, rh, out)
+            elif metric == "dew_point":
+                _dew_point(t, rh, out, scratch)
+            elif metric == "absolute_humidity":
+                _absolute_humidity(t, rh, out, scratch)
+            elif metric == "vapour_pressure_deficit":
+                _vapour_pressure_deficit(t, rh, out, scratch)
+            elif metric == "heat_index":
+                out[:] = _heat_index(t, rh)
+    return {m: v.reshape(t_all.shape) for m, v in results.items()}
+
+
+def add_derived_columns(
+    df: pd.DataFrame,
+    metrics: Sequence[str] = METRICS,
+    temperature: str = "temperature",
+    humidity: str = "humidity",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    inplace: bool = False,
+) -> Optional[pd.DataFrame]:
+    """Add derived columns to a DataFrame with temperature and humidity columns.
+
+    Returns:
+        A new DataFrame, or None if ``inplace`` is True
+    """
+    derived = derive(df[temperature].to_numpy(), df[humidity].to_numpy(), metrics, chunk_size)
+    if not inplace:
+        df = df.copy()
+    for metric, values in derived.items():
+        df[metric] = values
+    return None if inplace else df
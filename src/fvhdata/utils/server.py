@@ -0,0 +1,263 @@
+"""Small asyncio HTTP service for querying the sensor archive.
+
+The Parquet file is opened once (memory-mapped, see ``SensorStore``) and
+shared by all clients, so dashboards and notebooks don't each pay the load
+cost. Endpoints::
+
+    GET /devices
+    GET /series?dev=<id>&start=<time>&end=<time>&res=1h&columns=temperature,humidity
+    GET /aggregate?dev=<id>,<id>&start=<time>&end=<time>&stat=count,mean,min,max
+
+``columns`` may also name derived quantities such as ``dew_point`` or
+``heat_index`` (see ``fvhdata.utils.meteorology``). Times are ISO 8601 with a
+``T`` between the date and the time. A ``+`` in a query string means a space,
+so UTC offsets must be sent as ``%2B``, e.g. ``start=2024-06-10T00:00%2B03:00``;
+times containing a space are rejected.
+
+Responses are Arrow IPC streams (``format=arrow``, the default) or JSON
+(``format=json``, gzip-compressed when the client accepts it). Responses are
+kept in an LRU cache and carry an ETag; a matching ``If-None-Match`` gets a
+``304 Not Modified``. Reading a response into pandas::
+
+    import pyarrow as pa, urllib.request
+    with urllib.request.urlopen("http://127.0.0.1:8765/series?dev=6155&res=1h") as r:
+        df = pa.ipc.open_stream(r.read()).read_pandas()
+
+Run with ``python -m fvhdata.utils.server --parquet data/interim/data_all.parquet``.
+"""
+
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from http import HTTPStatus
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import pyarrow as pa
+
+from fvhdata.utils.constants import INTERIM
+from fvhdata.utils.store import SensorStore
+
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+CHUNK_SIZE = 1 << 16
+
+# status, content type, body, etag, content encoding
+Response = Tuple[int, str, bytes, Optional[str], Optional[str]]
+
+
+class QueryError(Exception):
+    """Invalid query, reported to the client with the given HTTP status."""
+
+    def __init__(self, message: str, status: int = HTTPStatus.BAD_REQUEST):
+        super().__init__(message)
+        self.status = status
+
+
+def table_to_arrow(table: pa.Table) -> bytes:
+    """Serialize a table as an Arrow IPC stream."""
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def table_to_json(table: pa.Table) -> bytes:
+    """Serialize a table as a JSON list of records, timestamps in ISO 8601."""
+    return table.to_pandas().to_json(orient="records", date_format="iso").encode()
+
+
+class QueryService:
+    """Answers queries against a ``SensorStore`` and caches the encoded responses.
+
+    Args:
+        store: The sensor data
+        cache_size: Maximum number of cached responses
+    """
+
+    def __init__(self, store: SensorStore, cache_size: int = 256):
+        self.store = store
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[tuple, Tuple[str, bytes, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _query(self, path: str, params: Dict[str, str]) -> pa.Table:
+        start, end = params.get("start"), params.get("end")
+        for name, value in (("start", start), ("end", end)):
+            if value is not None and " " in value:
+                raise QueryError(f"Invalid {name} time {value!r}: encode '+' as %2B and use 'T' before the time")
+        columns = params["columns"].split(",") if params.get("columns") else None
+        if columns:
+            unknown = set(columns) - set(self.store.columns)
+            if unknown:
+                raise QueryError(f"Unknown columns: {sorted(unknown)}")
+        try:
+            if path == "/devices":
+                return pa.table({self.store.device_column: self.store.devices})
+            if path == "/series":
+                if "dev" not in params:
+                    raise QueryError("Parameter 'dev' is required")
+                return self.store.series(params["dev"], start, end, params.get("res"), columns)
+            if path == "/aggregate":
+                devices = params["dev"].split(",") if params.get("dev") else None
+                stats = params.get("stat", "count,mean,min,max").split(",")
+                return self.store.aggregate(devices, start, end, stats, columns)
+        except KeyError as exc:
+            raise QueryError(str(exc.args[0]), HTTPStatus.NOT_FOUND) from exc
+        except ValueError as exc:
+            raise QueryError(str(exc)) from exc
+        raise QueryError(f"Unknown endpoint {path}", HTTPStatus.NOT_FOUND)
+
+    def respond(self, target: str, headers: Dict[str, str]) -> Response:
+        """Return the response for a request target like ``/series?dev=...``."""
+        url = urlsplit(target)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        fmt = params.pop("format", "arrow")
+        if fmt not in ("arrow", "json"):
+            return error_response(QueryError(f"Unknown format {fmt!r}"))
+        use_gzip = fmt == "json" and "gzip" in headers.get("accept-encoding", "")
+        key = (url.path, tuple(sorted(params.items())), fmt, use_gzip)
+
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if cached is None:
+            try:
+                table = self._query(url.path, params)
+            except QueryError as exc:
+                return error_response(exc)
+            if fmt == "arrow":
+                content_type, body = ARROW_STREAM, table_to_arrow(table)
+            else:
+                content_type, body = "application/json", table_to_json(table)
+                if use_gzip:
+                    body = gzip.compress(body, compresslevel=5)
+            etag = '"' + hashlib.sha1(self.store.version.encode() + body).hexdigest() + '"'
+            cached = (content_type, body, etag)
+            with self._lock:
+                self._cache[key] = cached
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        content_type, body, etag = cached
+        encoding = "gzip" if use_gzip else None
+        if headers.get("if-none-match") == etag:
+            return HTTPStatus.NOT_MODIFIED, content_type, b"", etag, None
+        return HTTPStatus.OK, content_type, body, etag, encoding
+
+
+def error_response(exc: QueryError) -> Response:
+    """Return a JSON error response for a failed query."""
+    return exc.status, "application/json", json.dumps({"error": str(exc)}).encode(), None, None
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str]]]:
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, target, _ = request_line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        return "", "", {}
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return method, target, headers
+
+
+async def _write_response(writer: asyncio.StreamWriter, response: Response, keep_alive: bool) -> None:
+    status, content_type, body, etag, encoding = response
+    lines = [
+        f"HTTP/1.1 {int(status)} {HTTPStatus(status).phrase}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(body)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    if etag:
+        lines.append(f"ETag: {etag}")
+    if encoding:
+        lines.append(f"Content-Encoding: {encoding}")
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+    # Stream large bodies in chunks so a slow client doesn't buffer everything at once
+    view = memoryview(body)
+    for offset in range(0, len(body), CHUNK_SIZE):
+        writer.write(view[offset : offset + CHUNK_SIZE])
+        await writer.drain()
+    await writer.drain()
+
+
+def make_handler(service: QueryService):
+    """Return an ``asyncio.start_server`` connection handler for the service."""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, target, headers = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                if method != "GET":
+                    response = error_response(QueryError("Only GET is supported", HTTPStatus.METHOD_NOT_ALLOWED))
+                else:
+                    # Queries are CPU-bound; run them off the event loop
+                    response = await loop.run_in_executor(None, service.respond, target, headers)
+                logging.info("%s %s %s", method, target, int(response[0]))
+                await _write_response(writer, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionResetError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    return handle
+
+
+async def serve(service: QueryService, host: str = "127.0.0.1", port: int = 8765) -> None:
+    """Serve queries until cancelled."""
+    server = await asyncio.start_server(make_handler(service), host, port)
+    logging.info("Serving %s on http://%s:%d", service.store.path, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve sensor data queries over HTTP")
+    parser.add_argument("--parquet", type=Path, default=INTERIM.joinpath("data_all.parquet"), help="Sensor data")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cache-size", type=int, default=256, help="Number of cached responses")
+    parser.add_argument("--log", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"])
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(format="%(asctime)s %(levelname)-8s %(message)s", level=getattr(logging, args.log))
+    service = QueryService(SensorStore(args.parquet), cache_size=args.cache_size)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""Embedded SQL over the sensor archive, FMI observations and sensor metadata.
+
+``connect()`` returns a DuckDB connection with these tables and views:
+
+- ``sensor_data``: the sensor Parquet file(s), columns ``time``, ``dev-id``, measurements
+- ``fmi_observations``: FMI weather observation CSV file(s), original column names
+- ``sensor_metadata``: one row per sensor from GeoJSON file(s), with ``lon``/``lat``
+  and the flat feature properties (the embedded measurements are left out)
+- ``sensor_hourly``: hourly count/mean/min/max per sensor, and the hourly mean of
+  the derived quantities (``dew_point_mean`` etc.)
+- ``sensor_hourly_meta``: ``sensor_hourly`` joined with ``sensor_metadata``
+
+The derived quantities of ``fvhdata.utils.meteorology`` are also available as
+scalar functions, e.g. ``dew_point(temperature, humidity)``.
+
+The files are scanned lazily, so DuckDB pushes column projections and time
+filters down to the Parquet reader and runs queries on all cores::
+
+    from fvhdata.utils.sql import query
+    query('''
+        SELECT a.hour, a.temperature_mean - b.temperature_mean AS excess
+        FROM sensor_hourly a JOIN sensor_hourly b USING (hour)
+        WHERE a."dev-id" LIKE '%6155' AND b."dev-id" LIKE '%6080' AND excess > 3
+    ''').to_pandas()
+"""
+
+import json
+from pathlib import Path
+from typing import List, Optional, Sequence, Union
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+
+from fvhdata.utils.constants import INTERIM
+from fvhdata.utils.meteorology import METRICS, derive
+
+
+PathList = Optional[Union[str, Path, Sequence[Union[str, Path]]]]
+
+DEFAULT_PARQUET = INTERIM.joinpath("data_all.parquet")
+DEFAULT_GEOJSON = INTERIM.joinpath("metadata_all.geojson")
+
+MEASUREMENTS = ("temperature", "humidity")
+
+
+def _paths(paths: PathList) -> List[str]:
+    if paths is None:
+        return []
+    if isinstance(paths, (str, Path)):
+        paths = [paths]
+    result = [str(p) for p in paths]
+    for path in result:
+        # Globs are resolved by DuckDB
+        if "*" not in path and not Path(path).exists():
+            raise FileNotFoundError(f"File not found: {path}")
+    return result
+
+
+def _sql_list(paths: List[str]) -> str:
+    return "[" + ", ".join("'" + p.replace("'", "''") + "'" for p in paths) + "]"
+
+
+def _derived_function(metric: str):
+    def function(temperature: pa.Array, humidity: pa.Array) -> pa.Array:
+        t = temperature.to_numpy(zero_copy_only=False)
+        rh = humidity.to_numpy(zero_copy_only=False)
+        return pa.array(derive(t, rh, [metric])[metric], from_pandas=True)
+
+    return function
+
+
+def register_functions(con: duckdb.DuckDBPyConnection) -> None:
+    """Register the derived meteorological quantities as ``<metric>(temperature, humidity)``."""
+    for metric in METRICS:
+        con.create_function(
+            metric,
+            _derived_function(metric),
+            [duckdb.type("DOUBLE"), duckdb.type("DOUBLE")],
+            duckdb.type("FLOAT"),
+            type="arrow",
+            null_handling="special",
+        )
+
+
+def read_sensor_metadata(files: Sequence[Union[str, Path]]) -> pd.DataFrame:
+    """Read sensor metadata from GeoJSON files into a flat DataFrame.
+
+    Nested properties (the latest ``measurement`` and the ``data`` arrays of
+    the published files) are dropped.
+    """
+    rows = []
+    for file in files:
+        with open(file) as f:
+            collection = json.load(f)
+        features = collection["features"] if collection.get("type") == "FeatureCollection" else [collection]
+        for feature in features:
+            properties = {k: v for k, v in feature.get("properties", {}).items() if not isinstance(v, (dict, list))}
+            lon, lat = (feature.get("geometry") or {}).get("coordinates", (None, None))[:2]
+            rows.append({"dev-id": feature.get("id", properties.get("id")), "lon": lon, "lat": lat, **properties})
+    return pd.DataFrame(rows).drop_duplicates("dev-id", keep="last")
+
+
+def connect(
+    parquet: PathList = DEFAULT_PARQUET,
+    fmi: PathList = None,
+    geojson: PathList = None,
+    threads: Optional[int] = None,
+) -> duckdb.DuckDBPyConnection:
+    """Return an in-memory DuckDB connection with the sensor tables registered.
+
+    Args:
+        parquet: Sensor Parquet file(s) or glob(s)
+        fmi: FMI observation CSV file(s)
+        geojson: Sensor metadata GeoJSON file(s); defaults to
+            ``data/interim/metadata_all.geojson`` when it exists
+        threads: Number of DuckDB worker threads, default all cores
+
+    Raises:
+        FileNotFoundError: If any given file doesn't exist
+    """
+    con = duckdb.connect()
+    if threads:
+        con.execute(f"SET threads = {int(threads)}")
+    # Hour buckets are in UTC regardless of the local time zone
+    con.execute("SET TimeZone = 'UTC'")
+    register_functions(con)
+
+    parquet_files = _paths(parquet)
+    if parquet_files:
+        con.execute(f"CREATE VIEW sensor_data AS SELECT * FROM read_parquet({_sql_list(parquet_files)})")
+        columns = {row[0] for row in con.execute("DESCRIBE sensor_data").fetchall()}
+        aggregates = ",\n".join(
+            f"count({m}) AS {m}_count, avg({m}) AS {m}_mean, min({m}) AS {m}_min, max({m}) AS {m}_max"
+            for m in MEASUREMENTS
+            if m in columns
+        )
+        if set(MEASUREMENTS) <= columns:
+            # Means of the per-reading values; unused columns are pruned by the optimizer
+            aggregates += "".join(f",\n avg({m}(temperature, humidity)) AS {m}_mean" for m in METRICS)
+        con.execute(
+            f"""
+            CREATE VIEW sensor_hourly AS
+            SELECT "dev-id", date_trunc('hour', time) AS hour, {aggregates}
+            FROM sensor_data
+            GROUP BY ALL
+            """
+        )
+
+    fmi_files = _paths(fmi)
+    if fmi_files:
+        con.execute(f"CREATE VIEW fmi_observations AS SELECT * FROM read_csv({_sql_list(fmi_files)}, header = true)")
+
+    if geojson is None and DEFAULT_GEOJSON.exists():
+        geojson = DEFAULT_GEOJSON
+    geojson_files = _paths(geojson)
+    if geojson_files:
+        con.register("sensor_metadata", read_sensor_metadata(geojson_files))
+        if parquet_files:
+            con.execute(
+                """
+                CREATE VIEW sensor_hourly_meta AS
+                SELECT h.*, m.* EXCLUDE ("dev-id")
+                FROM sensor_hourly h LEFT JOIN sensor_metadata m USING ("dev-id")
+                """
+            )
+    return con
+
+
+def query(sql: str, con: Optional[duckdb.DuckDBPyConnection] = None, **connect_kwargs) -> pa.Table:
+    """Run a query and return the result as an Arrow table.
+
+    Args:
+        sql: The query
+        con: Connection from ``connect()``; a new one is created with
+            ``connect_kwargs`` if not given
+    """
+    con = con or connect(**connect_kwargs)
+    return con.execute(sql).fetch_arrow_table()
+
+
+def query_batches(
+    sql: str, con: Optional[duckdb.DuckDBPyConnection] = None, batch_size: int = 100_000, **connect_kwargs
+) -> pa.RecordBatchReader:
+    """Run a query and stream the result as Arrow record batches.
+
+    Use this for results that don't fit comfortably in memory.
+    """
+    con = con or connect(**connect_kwargs)
+    return con.execute(sql).fetch_record_batch(batch_size)
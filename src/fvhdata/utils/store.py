@@ -0,0 +1,306 @@
+"""Device-indexed, memory-mapped access to the combined sensor Parquet file.
+
+``SensorStore`` opens the Parquet file once and builds a per-device index
+(row positions sorted by device and time), so a time slice of one device is
+two binary searches and a ``take`` instead of a boolean filter over the whole
+archive. Resampling uses integer binning of the epoch timestamps.
+
+Derived quantities (``dew_point``, ``absolute_humidity`` etc., see
+``fvhdata.utils.meteorology``) can be requested like any measurement column.
+They are computed only for the rows of the requested slice, before resampling.
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from fvhdata.utils.meteorology import METRICS, derive
+
+
+TimeLike = Optional[Union[str, pd.Timestamp]]
+
+AGGREGATES = ("count", "mean", "min", "max", "std")
+
+
+def _to_ns(value: TimeLike, default: int) -> int:
+    if value is None or value == "":
+        return default
+    ts = pd.Timestamp(value)
+    ts = ts.tz_localize("UTC") if ts.tz is None else ts.tz_convert("UTC")
+    return ts.value
+
+
+class SensorStore:
+    """Read-only view of a sensor Parquet file, indexed by device.
+
+    Args:
+        path: Parquet file with a time column (the pandas index), a device column
+            and measurement columns
+        device_column: Name of the device id column
+        time_column: Name of the time column
+
+    Raises:
+        FileNotFoundError: If the file doesn't exist
+    """
+
+    def __init__(self, path: Union[str, Path], device_column: str = "dev-id", time_column: str = "time"):
+        self.path = Path(path)
+        if not self.path.exists():
+            raise FileNotFoundError(f"File not found: {self.path}")
+        self.device_column = device_column
+        self.time_column = time_column
+        self.mtime_ns = self.path.stat().st_mtime_ns
+        # Drop the pandas metadata so that the time column stays a column in derived tables
+        self.table = pq.read_table(self.path, memory_map=True).replace_schema_metadata(None)
+        self.measurements = [
+            f.name
+            for f in self.table.schema
+            if f.name not in (device_column, time_column)
+            and (pa.types.is_floating(f.type) or pa.types.is_integer(f.type))
+        ]
+        # Derived columns are available when the inputs are
+        self.derived = list(METRICS) if {"temperature", "humidity"} <= set(self.measurements) else []
+        self._build_index()
+
+    def _build_index(self) -> None:
+        times = self.table.column(self.time_column)
+        if not pa.types.is_timestamp(times.type):
+            raise ValueError(f"Column {self.time_column!r} is not a timestamp column")
+        ns = pd.to_datetime(times.to_numpy(), utc=True).as_unit("ns").asi8
+        codes, uniques = pd.factorize(self.table.column(self.device_column).to_numpy(zero_copy_only=False))
+        # Sort by device, then time; rows that are already in time order keep it
+        order = np.lexsort((ns, codes))
+        self._order = order
+        self._times = ns[order]
+        boundaries = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        self._ranges: Dict[str, tuple] = {
+            str(dev): (int(boundaries[i]), int(boundaries[i + 1])) for i, dev in enumerate(uniques)
+        }
+        self.devices: List[str] = sorted(self._ranges)
+
+    @property
+    def version(self) -> str:
+        """Identifier that changes when the underlying file changes."""
+        return f"{self.path.name}-{self.mtime_ns}"
+
+    @property
+    def columns(self) -> List[str]:
+        """Measurement columns and derived columns that can be requested."""
+        return self.measurements + self.derived
+
+    def resolve(self, device: str) -> str:
+        """Return the full device id for an id or a unique suffix of it (e.g. "6155").
+
+        Raises:
+            KeyError: If the device is unknown or the suffix is ambiguous
+        """
+        if device in self._ranges:
+            return device
+        matches = [d for d in self.devices if d.endswith(device)]
+        if len(matches) != 1:
+            raise KeyError(f"Device {device!r} matches {len(matches)} devices")
+        return matches[0]
+
+    def _positions(self, device: str, start: TimeLike = None, end: TimeLike = None) -> np.ndarray:
+        """Return the device's sorted row positions in [start, end)."""
+        first, last = self._ranges[self.resolve(device)]
+        times = self._times[first:last]
+        lo = np.searchsorted(times, _to_ns(start, np.iinfo(np.int64).min), side="left")
+        hi = np.searchsorted(times, _to_ns(end, np.iinfo(np.int64).max), side="left")
+        return np.arange(first + lo, first + hi)
+
+    def _take(self, rows: np.ndarray, columns: Sequence[str], time: bool = True) -> pa.Table:
+        """Return the given table rows with stored and derived columns, in the order requested.
+
+        Raises:
+            ValueError: If a column is neither stored nor derived
+        """
+        unknown = set(columns) - set(self.columns)
+        if unknown:
+            raise ValueError(f"Unknown columns: {sorted(unknown)}")
+        selected = [self.time_column] if time else []
+        stored = [c for c in columns if c in self.measurements]
+        metrics = [c for c in columns if c not in self.measurements]
+        inputs = ["temperature", "humidity"] if metrics else []
+        table = self.table.select(list(dict.fromkeys(selected + stored + inputs))).take(pa.array(rows))
+        if metrics:
+            values = derive(
+                table.column("temperature").to_numpy(zero_copy_only=False),
+                table.column("humidity").to_numpy(zero_copy_only=False),
+                metrics,
+            )
+            for metric in metrics:
+                table = table.append_column(metric, pa.array(values[metric], from_pandas=True))
+        return table.select(selected + list(columns))
+
+    def slice(
+        self,
+        device: str,
+        start: TimeLike = None,
+        end: TimeLike = None,
+        columns: Optional[Sequence[str]] = None,
+    ) -> pa.Table:
+        """Return the raw rows of one device in [start, end), in time order."""
+        positions = self._positions(device, start, end)
+        return self._take(self._order[positions], columns or self.measurements)
+
+    def tail(self, device: str, n: int = 1, columns: Optional[Sequence[str]] = None) -> pa.Table:
+        """Return the latest ``n`` rows of one device."""
+        first, last = self._ranges[self.resolve(device)]
+        return self._take(self._order[max(first, last - n) : last], columns or self.measurements)
+
+    def series(
+        self,
+        device: str,
+        start: TimeLike = None,
+        end: TimeLike = None,
+        resolution: Optional[str] = None,
+        columns: Optional[Sequence[str]] = None,
+    ) -> pa.Table:
+        """Return one device's data in [start, end), optionally resampled to mean values.
+
+        Args:
+            device: Device id or a unique suffix of it
+            start: Inclusive start time, naive times are UTC
+            end: Exclusive end time
+            resolution: Pandas offset like "10min" or "1h"; bins are labelled by
+                their left edge and empty bins are omitted
+            columns: Measurement or derived columns, default all measurements
+
+        Returns:
+            Arrow table with the time column, the measurement columns and, when
+            resampled, the number of readings per bin in a ``count`` column
+        """
+        columns = list(columns or self.measurements)
+        positions = self._positions(device, start, end)
+        if not resolution:
+            return self._take(self._order[positions], columns)
+
+        step = pd.Timedelta(resolution).value
+        if step <= 0:
+            raise ValueError(f"Invalid resolution {resolution!r}")
+        bins = self._times[positions] // step
+        # Positions are in time order, so bin ids are sorted: unique + inverse gives the groups
+        labels, inverse = np.unique(bins, return_inverse=True)
+        rows = self._take(self._order[positions], columns, time=False)
+        data = {self.time_column: pa.array(labels * step, type=pa.timestamp("ns", tz="UTC"))}
+        for column in columns:
+            values = rows.column(column).to_numpy(zero_copy_only=False).astype(np.float64)
+            valid = ~np.isnan(values)
+            counts = np.bincount(inverse[valid], minlength=len(labels))
+            sums = np.bincount(inverse[valid], weights=values[valid], minlength=len(labels))
+            with np.errstate(invalid="ignore", divide="ignore"):
+                data[column] = pa.array(sums / counts, mask=counts == 0)
+        data["count"] = pa.array(np.bincount(inverse, minlength=len(labels)))
+        return pa.table(data)
+
+    def _device_positions(self, devices: Optional[Sequence[str]], first_position) -> tuple:
+        """Return the resolved devices, the row positions of all of them and each position's device number.
+
+        ``first_position(first, last)`` returns the first position to include for a
+        device whose sorted positions are ``first:last``.
+        """
+        devices = [self.resolve(d) for d in devices] if devices else self.devices
+        chunks = [np.arange(first_position(first, last), last) for first, last in (self._ranges[d] for d in devices)]
+        positions = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int64)
+        device_numbers = np.repeat(np.arange(len(devices)), [len(c) for c in chunks])
+        return devices, positions, device_numbers
+
+    def latest(
+        self, n: int = 1, devices: Optional[Sequence[str]] = None, columns: Optional[Sequence[str]] = None
+    ) -> pa.Table:
+        """Return the latest ``n`` rows of every device in one table, with the device column.
+
+        Rows are ordered by device (in the order of ``devices``, default all) and time.
+        """
+        devices, positions, device_numbers = self._device_positions(devices, lambda first, last: max(first, last - n))
+        table = self._take(self._order[positions], columns or self.measurements)
+        return table.add_column(0, self.device_column, pa.array(np.asarray(devices, dtype=object)[device_numbers]))
+
+    def rollup(
+        self,
+        resolution: str,
+        periods: int,
+        devices: Optional[Sequence[str]] = None,
+        columns: Optional[Sequence[str]] = None,
+    ) -> pa.Table:
+        """Return mean values of the last ``periods`` bins of every device in one table.
+
+        The bins end with the one containing the device's latest reading; empty bins
+        are omitted. Bins are aligned to multiples of ``resolution`` since the epoch
+        (UTC) and labelled by their left edge.
+
+        Returns:
+            Arrow table with the device column, the time column, the columns and a
+            ``count`` column, ordered by device and time
+        """
+        step = pd.Timedelta(resolution).value
+        if step <= 0 or periods <= 0:
+            raise ValueError(f"Invalid resolution {resolution!r} or periods {periods}")
+        columns = list(columns or self.measurements)
+
+        def window_start(first: int, last: int) -> int:
+            start = (self._times[last - 1] // step - periods + 1) * step
+            return first + int(np.searchsorted(self._times[first:last], start, side="left"))
+
+        devices, positions, device_numbers = self._device_positions(devices, window_start)
+        # Positions are sorted by device and time, so (device, bin) keys are sorted too
+        bins = self._times[positions] // step
+        keys = device_numbers.astype(np.int64) * (1 << 40) + bins
+        labels, first_rows, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        rows = self._take(self._order[positions], columns, time=False)
+        data = {
+            self.device_column: pa.array(np.asarray(devices, dtype=object)[device_numbers[first_rows]]),
+            self.time_column: pa.array(bins[first_rows] * step, type=pa.timestamp("ns", tz="UTC")),
+        }
+        for column in columns:
+            values = rows.column(column).to_numpy(zero_copy_only=False).astype(np.float64)
+            valid = ~np.isnan(values)
+            counts = np.bincount(inverse[valid], minlength=len(labels))
+            sums = np.bincount(inverse[valid], weights=values[valid], minlength=len(labels))
+            with np.errstate(invalid="ignore", divide="ignore"):
+                data[column] = pa.array(sums / counts, mask=counts == 0)
+        data["count"] = pa.array(np.bincount(inverse, minlength=len(labels)))
+        return pa.table(data)
+
+    def aggregate(
+        self,
+        devices: Optional[Sequence[str]] = None,
+        start: TimeLike = None,
+        end: TimeLike = None,
+        stats: Sequence[str] = ("count", "mean", "min", "max"),
+        columns: Optional[Sequence[str]] = None,
+    ) -> pa.Table:
+        """Return summary statistics per device over [start, end).
+
+        Raises:
+            ValueError: If an unknown statistic or column is requested
+        """
+        unknown = set(stats) - set(AGGREGATES)
+        if unknown:
+            raise ValueError(f"Unknown statistics: {sorted(unknown)}")
+        columns = list(columns or self.measurements)
+        devices = [self.resolve(d) for d in devices] if devices else self.devices
+        result: Dict[str, list] = {self.device_column: devices}
+        for column in columns:
+            for stat in stats:
+                result[f"{column}_{stat}"] = []
+        for device in devices:
+            rows = self._take(self._order[self._positions(device, start, end)], columns, time=False)
+            for column in columns:
+                v = rows.column(column).to_numpy(zero_copy_only=False).astype(np.float64)
+                v = v[~np.isnan(v)]
+                for stat in stats:
+                    if stat == "count":
+                        result[f"{column}_{stat}"].append(len(v))
+                    else:
+                        result[f"{column}_{stat}"].append(float(getattr(np, stat)(v)) if len(v) else None)
+        return pa.table(result)
+
+    def to_pandas(self, table: pa.Table) -> pd.DataFrame:
+        """Convert a table returned by the store to a DataFrame indexed by time."""
+        return table.to_pandas().set_index(self.time_column)
@@ -9,6 +9,8 @@ import matplotlib.pyplot as plt
 import pandas as pd
 import seaborn as sns
 
+from fvhdata.utils.cache import memoize
+
 
 def get_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser()
@@ -81,6 +83,56 @@ def read_data(data_files: list) -> pd.DataFrame:
     return df
 
 
+def prepare_data(data_files: list, groupby: str, device_ids: Optional[list] = None) -> pd.DataFrame:
+    """
+    Read the data files and keep only the groupby column of the selected devices
+    :param data_files: list of file names
+    :param groupby: column to keep (e.g. device id)
+    :param device_ids: values of the groupby column to keep (optional)
+    :return: pd.DataFrame
+    """
+    # Read parquet files into a DataFrame
+    df = read_data(data_files)
+    # Drop all columns except groupby
+    df = df[[groupby]]
+    # Set value to 0 in all rows where datapoint_id is between 145346 and 145901
+    # df = df[df[groupby].between("145346", "145901")]
+    # Replace NaN values with 0
+    df = df.fillna(0)
+
+    # Remove all rows where index is between 2024-07-30 and 2024-08-07
+    # df = df[~df.index.to_series().between("2024-07-30", "2024-08-07")]
+    df = df[~df.index.to_series().between("2024-09-01", "2024-09-12")]
+
+    print(df.info())
+    print(df.head(20))
+
+    # Drop all rows where datapointid is not in device_ids
+    if device_ids:
+        df = df[df[groupby].isin(device_ids)]
+    print(df.info())
+    print(df.head(20))
+    return df
+
+
+@memoize(depends=[read_data, prepare_data])
+def count_measurements(
+    data_files: list, groupby: str, resample: str, device_ids: Optional[list] = None
+) -> pd.DataFrame:
+    """
+    Count measurements per resampling period for each value of the groupby column.
+    The cache key uses the size and modification time of the data files, not their content,
+    and the source of read_data and prepare_data, so editing the filters invalidates it.
+    :param data_files: list of file names
+    :param groupby: column to count values of (e.g. device id)
+    :param resample: resampling frequency (e.g. 1h, 1D)
+    :param device_ids: values of the groupby column to count (optional)
+    :return: pd.DataFrame with periods as rows and groupby values as columns
+    """
+    df = prepare_data(data_files, groupby, device_ids)
+    return df.resample(resample)[groupby].value_counts().unstack()
+
+
 def visualize_daily_measurement_counts_per_sensor(df_resampled: pd.DataFrame) -> None:
     # TODO: Add more descriptive labels for sensors
     order = df_resampled.mode().max().sort_values(ascending=False).index
@@ -99,29 +151,7 @@ def visualize_daily_measurement_counts_per_sensor(df_resampled: pd.DataFrame) ->
 
 def main():
     args = get_args()
-    # Read parquet files from args.data into a DataFrame
-    df = read_data(args.data)
-    # Drop all columns except args.groupby
-    df = df[[args.groupby]]
-    # Set value to 0 in all rows where datapoint_id is between 145346 and 145901
-    # df = df[df[args.groupby].between("145346", "145901")]
-    # Replace NaN values with 0
-    df = df.fillna(0)
-
-    # Remove all rows where index is between 2024-07-30 and 2024-08-07
-    # df = df[~df.index.to_series().between("2024-07-30", "2024-08-07")]
-    df = df[~df.index.to_series().between("2024-09-01", "2024-09-12")]
-
-    print(df.info())
-    print(df.head(20))
-
-    # Drop all rows where datapointid is not in args.device_ids
-    if args.device_ids:
-        df = df[df[args.groupby].isin(args.device_ids)]
-    print(df.info())
-    print(df.head(20))
-    df_resampled = df.resample(args.resample)[args.groupby].value_counts()
-    df_resampled = df_resampled.unstack()
+    df_resampled = count_measurements(args.data, args.groupby, args.resample, args.device_ids)
     ## Replace all NaN values with 0 # Does not work
     ## df_resampled = df_resampled.fillna(0)
     # Replace all values greater than 1440 with -1
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from fvhdata.utils.alignment import align_to_grid
+
+
+def readings(*rows):
+    """Build raw readings from (device, UTC time, temperature) tuples."""
+    devices, times, temperatures = zip(*rows)
+    index = pd.DatetimeIndex([pd.Timestamp(t) for t in times], name="time")
+    index = index.tz_localize("UTC") if index.tz is None else index
+    return pd.DataFrame({"dev-id": list(devices), "temperature": list(temperatures)}, index=index)
+
+
+def column(grid, name="temperature"):
+    return grid.to_frame(name).iloc[:, 0].tolist()
+
+
+@pytest.mark.parametrize("reverse", [False, True])
+def test_nearest_reading_wins(reverse):
+    rows = [
+        ("A", "2024-06-01T00:00:00", 1.0),
+        ("A", "2024-06-01T00:09:00", 2.0),  # 60 s before 00:10
+        ("A", "2024-06-01T00:10:20", 3.0),  # 20 s after 00:10
+        ("A", "2024-06-01T00:14:59", 4.0),  # nearest to 00:10, but farther than the reading above
+        ("A", "2024-06-01T00:15:01", 5.0),  # nearest to 00:20
+    ]
+    grid = align_to_grid(readings(*(rows[::-1] if reverse else rows)), columns=["temperature"])
+    assert list(grid.times) == list(pd.date_range("2024-06-01", periods=3, freq="10min", tz="UTC", name="time"))
+    assert column(grid) == [1.0, 3.0, 5.0]
+    assert grid.valid.all()
+
+
+def test_tolerance():
+    df = readings(
+        ("A", "2024-06-01T00:00:00", 1.0),
+        ("A", "2024-06-01T00:12:00", 2.0),  # exactly at the tolerance
+        ("A", "2024-06-01T00:22:00.001", 3.0),  # just outside
+        ("A", "2024-06-01T00:31:59.999", 4.0),  # just inside
+    )
+    grid = align_to_grid(df, tolerance="2min", columns=["temperature"])
+    assert grid.valid[:, 0].tolist() == [True, True, False, True]
+    np.testing.assert_array_equal(column(grid), [1.0, 2.0, np.nan, 4.0])
+
+    # Without a tolerance every reading goes to its nearest slot
+    assert align_to_grid(df, columns=["temperature"]).valid.all()
+
+
+def test_valid_nan_and_unknown_sensors():
+    df = readings(
+        ("A", "2024-06-01T00:00:00", np.nan),
+        ("B", "2024-06-01T00:00:30", 2.0),
+        ("C", "2024-06-01T00:10:00", 3.0),
+    )
+    grid = align_to_grid(df, columns=["temperature"], sensors=["B", "A"], end="2024-06-01T00:30")
+    assert grid.sensors == ["B", "A"]
+    assert grid.valid.tolist() == [[True, True], [False, False], [False, False]]
+    assert np.isnan(grid.values["temperature"][0, 1])
+
+
+def test_gaps():
+    # Slot:  0  1  2  3  4  5  6  7
+    # A:     .  .  x  x  x  .  x  x   gaps at the start and in the middle
+    # B:     x  x  x  .  x  x  .  .   gaps in the middle and at the end
+    present = {"A": [2, 3, 4, 6, 7], "B": [0, 1, 2, 4, 5]}
+    start = pd.Timestamp("2024-06-01", tz="UTC")
+    df = readings(
+        *[
+            (device, start + pd.Timedelta(minutes=10 * slot, seconds=17), float(slot))
+            for device, slots in present.items()
+            for slot in slots
+        ]
+    )
+    grid = align_to_grid(df, columns=["temperature"], start=start, end=start + pd.Timedelta(minutes=80))
+    assert grid.valid.shape == (8, 2)
+
+    def slot_time(slot):
+        return start + pd.Timedelta(minutes=10 * slot)
+
+    gaps = grid.gaps()
+    expected = pd.DataFrame(
+        {
+            "dev-id": ["A", "A", "B", "B"],
+            "start": [slot_time(0), slot_time(5), slot_time(3), slot_time(6)],
+            "end": [slot_time(2), slot_time(6), slot_time(4), slot_time(8)],
+            "slots": [2, 1, 1, 2],
+        }
+    )
+    pd.testing.assert_frame_equal(gaps, expected, check_dtype=False)
+    assert grid.gaps(min_slots=2)["start"].tolist() == [slot_time(0), slot_time(6)]
+    assert grid.coverage().tolist() == [5 / 8, 5 / 8]
+
+
+def test_gaps_none_and_all():
+    df = readings(("A", "2024-06-01T00:00:00", 1.0), ("A", "2024-06-01T00:10:00", 2.0))
+    assert align_to_grid(df, columns=["temperature"]).gaps().empty
+    gaps = align_to_grid(df, columns=["temperature"], sensors=["A", "B"]).gaps()
+    assert gaps["dev-id"].tolist() == ["B"]
+    assert gaps["slots"].tolist() == [2]
@@ -0,0 +1,64 @@
+import importlib
+import sys
+
+import pandas as pd
+
+from fvhdata.utils.cache import DiskCache, memoize
+
+
+MODULE = """
+import pandas as pd
+
+
+def prepare(path):
+    return pd.read_parquet(path).{filter}
+
+
+def count(path):
+    return len(prepare(path))
+"""
+
+
+def load_module(tmp_path, name, filter):
+    tmp_path.joinpath(f"{name}.py").write_text(MODULE.format(filter=filter))
+    sys.path.insert(0, str(tmp_path))
+    try:
+        sys.modules.pop(name, None)
+        importlib.invalidate_caches()
+        return importlib.import_module(name)
+    finally:
+        sys.path.remove(str(tmp_path))
+
+
+def test_memoize_file_argument(tmp_path):
+    cache = DiskCache(tmp_path.joinpath("cache"))
+    path = tmp_path.joinpath("data.parquet")
+    pd.DataFrame({"x": [1, 2, 3]}).to_parquet(path)
+    calls = []
+
+    @memoize(cache=cache)
+    def total(file_path):
+        calls.append(file_path)
+        return int(pd.read_parquet(file_path)["x"].sum())
+
+    assert total(path) == 6
+    assert total(path) == 6
+    assert len(calls) == 1
+    pd.DataFrame({"x": [1, 2, 3, 4]}).to_parquet(path)
+    assert total(path) == 10
+    assert total.cache_info().hits == 1
+
+
+def test_memoize_depends(tmp_path):
+    cache = DiskCache(tmp_path.joinpath("cache"))
+    path = tmp_path.joinpath("data.parquet")
+    pd.DataFrame({"x": [1, 2, 3]}).to_parquet(path)
+
+    module = load_module(tmp_path, "memoize_depends", "head(3)")
+    assert memoize(module.count, cache=cache)(path) == 3
+    assert memoize(module.count, cache=cache, depends=[module.prepare])(path) == 3
+
+    # Same name and source of count, but an edited prepare
+    module = load_module(tmp_path, "memoize_depends", "iloc[:1]")
+    assert memoize(module.count, cache=cache)(path) == 3  # stale without depends
+    assert memoize(module.count, cache=cache, depends=[module.prepare])(path) == 1
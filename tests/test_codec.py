@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from fvhdata.utils.codec import (
+    BLOCK_SIZE,
+    KIND_GRID,
+    KIND_XOR,
+    ChunkReader,
+    decode_chunk,
+    decode_frame,
+    encode_chunk,
+    encode_frame,
+    read_archive,
+    write_archive,
+)
+
+
+def make_times(n: int, seed: int = 0) -> np.ndarray:
+    """Roughly 10-minute readings with millisecond jitter, as int64 nanoseconds."""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2024-06-01", tz="UTC").value
+    steps = 600_000 + rng.integers(-500, 500, n)
+    return start + np.cumsum(steps) * 1_000_000
+
+
+def make_columns(n: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    return {
+        "temperature": np.round(15 + np.cumsum(rng.normal(0, 0.3, n)), 1),
+        "humidity": np.round(2 * (60 + np.cumsum(rng.normal(0, 1, n)))) / 2,
+    }
+
+
+def assert_roundtrip(times: np.ndarray, columns: dict) -> ChunkReader:
+    data = encode_chunk(times, columns)
+    decoded_times, decoded = decode_chunk(data)
+    np.testing.assert_array_equal(decoded_times.view(np.int64), times)
+    assert list(decoded) == list(columns)
+    for name, values in columns.items():
+        np.testing.assert_array_equal(decoded[name], values)
+        assert decoded[name].dtype == np.float64
+    return ChunkReader(data)
+
+
+@pytest.mark.parametrize("n", [0, 1, 2, BLOCK_SIZE - 1, BLOCK_SIZE, BLOCK_SIZE + 1, 3 * BLOCK_SIZE + 5])
+def test_roundtrip_lengths(n):
+    reader = assert_roundtrip(make_times(n), make_columns(n))
+    assert reader.n_rows == n
+    assert reader.n_blocks == -(-n // BLOCK_SIZE)
+
+
+def test_grid_values_are_detected():
+    reader = assert_roundtrip(make_times(100), make_columns(100))
+    assert reader._columns["temperature"][:2] == (KIND_GRID, 10)
+    assert reader._columns["humidity"][:2] == (KIND_GRID, 2)
+
+
+@pytest.mark.parametrize("n_missing", [1, 5, BLOCK_SIZE, BLOCK_SIZE + 3])
+def test_nan_run_at_start(n_missing):
+    n = BLOCK_SIZE + 10
+    columns = make_columns(n)
+    columns["temperature"][:n_missing] = np.nan
+    columns["humidity"][n_missing + 2 : n_missing + 4] = np.nan
+    assert_roundtrip(make_times(n), columns)
+
+
+def test_all_nan():
+    assert_roundtrip(make_times(3), {"temperature": np.full(3, np.nan)})
+
+
+def test_non_grid_floats():
+    n = BLOCK_SIZE + 1
+    rng = np.random.default_rng(1)
+    values = rng.normal(15, 5, n)
+    values[[0, 7, n - 1]] = np.nan
+    columns = {"temperature": values, "pressure": np.full(n, 1013.2501), "small": rng.normal(0, 1e-300, n)}
+    reader = assert_roundtrip(make_times(n), columns)
+    assert reader._columns["temperature"][0] == KIND_XOR
+    assert reader._columns["small"][0] == KIND_XOR
+
+
+def test_special_floats():
+    values = np.array([0.0, -0.0, np.inf, -np.inf, 5e-324, -1.7976931348623157e308, np.nan, 1 / 3] * 200)
+    times = make_times(len(values))
+    decoded = decode_chunk(encode_chunk(times, {"x": values}, block_size=100))[1]["x"]
+    valid = ~np.isnan(values)
+    np.testing.assert_array_equal(decoded[valid].view(np.uint64), values[valid].view(np.uint64))
+    assert np.isnan(decoded[~valid]).all()
+
+
+def test_datetime_times():
+    times = make_times(10)
+    data = encode_chunk(times.astype("datetime64[ns]"), make_columns(10))
+    np.testing.assert_array_equal(decode_chunk(data)[0].view(np.int64), times)
+
+
+def test_unsorted_times():
+    with pytest.raises(ValueError):
+        encode_chunk(make_times(3)[::-1], make_columns(3))
+
+
+def test_read_block():
+    n = 2 * BLOCK_SIZE + 3
+    times = make_times(n)
+    columns = make_columns(n)
+    columns["temperature"][BLOCK_SIZE - 1 : BLOCK_SIZE + 2] = np.nan
+    reader = ChunkReader(encode_chunk(times, columns))
+    for block in (2, 0, 1):
+        rows = slice(block * BLOCK_SIZE, (block + 1) * BLOCK_SIZE)
+        block_times, values = reader.read_block(block, ["temperature"])
+        np.testing.assert_array_equal(block_times.view(np.int64), times[rows])
+        assert list(values) == ["temperature"]
+        np.testing.assert_array_equal(values["temperature"], columns["temperature"][rows])
+    assert len(reader.read_block(2)[0]) == 3
+    with pytest.raises(IndexError):
+        reader.read_block(3)
+
+
+def make_frame() -> pd.DataFrame:
+    frames = []
+    for seed, device in enumerate(["24E124136E106616", "24E124136E106080", "24E124136E106155"]):
+        n = 50 + seed
+        frame = pd.DataFrame(make_columns(n, seed), index=pd.DatetimeIndex(make_times(n, seed), tz="UTC", name="time"))
+        frame.insert(0, "dev-id", device)
+        frames.append(frame)
+    # Interleave the devices, as in the raw data
+    return pd.concat(frames).sample(frac=1, random_state=0)
+
+
+def test_frame_roundtrip():
+    df = make_frame()
+    chunks = encode_frame(df)
+    assert list(chunks) == list(pd.unique(df["dev-id"]))
+    decoded = decode_frame(chunks)
+    expected = df.reset_index().sort_values(["dev-id", "time"]).set_index("time")
+    pd.testing.assert_frame_equal(
+        decoded.reset_index().sort_values(["dev-id", "time"]).set_index("time"), expected, check_index_type=False
+    )
+
+
+def test_archive_device_filter(tmp_path):
+    df = make_frame()
+    path = write_archive(df, tmp_path.joinpath("sensors.fvha"))
+    assert set(read_archive(path)["dev-id"]) == set(df["dev-id"])
+
+    selected = read_archive(path, devices=["24E124136E106155", "unknown"])
+    expected = df[df["dev-id"] == "24E124136E106155"].sort_index()
+    assert set(selected["dev-id"]) == {"24E124136E106155"}
+    pd.testing.assert_frame_equal(selected, expected, check_index_type=False)
+
+    assert read_archive(path, devices=[]).empty
+
+
+def test_archive_bad_file(tmp_path):
+    path = tmp_path.joinpath("sensors.parquet")
+    path.write_bytes(b"PAR1")
+    with pytest.raises(ValueError):
+        read_archive(path)
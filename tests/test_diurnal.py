@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from fvhdata.utils.diurnal import DiurnalCube
+
+
+DEVICES = ["24E124136E106155", "24E124136E106080", "24E124136E106616"]
+
+
+@pytest.fixture(scope="module")
+def df():
+    """Hourly readings over the turn of a month, with NaNs, in random row order."""
+    rng = np.random.default_rng(0)
+    frames = []
+    for device in DEVICES:
+        times = pd.date_range("2024-06-20", "2024-07-10", freq="1h", tz="UTC") + pd.Timedelta(minutes=3)
+        frame = pd.DataFrame(
+            {"dev-id": device, "temperature": np.round(rng.normal(15, 5, len(times)), 1)},
+            index=pd.DatetimeIndex(times, name="time"),
+        )
+        frame.iloc[::11, 1] = np.nan
+        frames.append(frame)
+    return pd.concat(frames).sample(frac=1, random_state=0)
+
+
+def assert_cubes_equal(a: DiurnalCube, b: DiurnalCube):
+    order = [b.sensors.index(s) for s in a.sensors]
+    assert sorted(a.sensors) == sorted(b.sensors)
+    for name in ("count", "total", "total_sq", "hist"):
+        np.testing.assert_allclose(getattr(a, name), getattr(b, name)[order])
+    np.testing.assert_array_equal(a.last_times, b.last_times[order])
+
+
+def test_incremental_update(df, tmp_path):
+    single = DiurnalCube("temperature").update(df)
+
+    # The first update has everything up to July 1, except one sensor that lags two days behind
+    lagging = df["dev-id"] == DEVICES[1]
+    cut = pd.Timestamp("2024-07-01", tz="UTC")
+    first = df[(df.index < cut) & ~lagging | (df.index < cut - pd.Timedelta(days=2)) & lagging]
+    cube = DiurnalCube("temperature").update(first)
+    cube.save(tmp_path.joinpath("cube.npz"))
+
+    cube = DiurnalCube.load(tmp_path.joinpath("cube.npz"))
+    new_rows = cube.new_rows(df)
+    assert len(new_rows) == len(df) - len(first)
+    cube.update(new_rows)
+    assert_cubes_equal(single, cube)
+    assert cube.last_time == df.index.max()
+    assert cube.new_rows(df).empty
+
+
+def test_new_sensor(df):
+    cube = DiurnalCube("temperature").update(df[df["dev-id"] != DEVICES[2]])
+    new_rows = cube.new_rows(df)
+    assert set(new_rows["dev-id"]) == {DEVICES[2]}
+    assert_cubes_equal(DiurnalCube("temperature").update(df), cube.update(new_rows))
+
+
+def test_load_old_format(df, tmp_path):
+    cube = DiurnalCube("temperature").update(df)
+    path = tmp_path.joinpath("old.npz")
+    # Cubes saved before last_times kept one last_time for all sensors
+    np.savez_compressed(
+        path,
+        measurement=cube.measurement,
+        bins=np.asarray(cube.bins),
+        tz=cube.tz,
+        last_time=cube.last_time.isoformat(),
+        device_column=cube.device_column,
+        sensors=np.asarray(cube.sensors, dtype=str),
+        count=cube.count,
+        total=cube.total,
+        total_sq=cube.total_sq,
+        hist=cube.hist,
+    )
+    loaded = DiurnalCube.load(path)
+    assert loaded.last_time == cube.last_time
+    assert (loaded.last_times == cube.last_times.max()).all()
+    assert loaded.new_rows(df).empty
+
+
+def test_empty_update(df):
+    cube = DiurnalCube("temperature")
+    assert cube.last_time is None
+    assert len(cube.new_rows(df)) == len(df)
+    cube.update(df.assign(temperature=np.nan))
+    assert cube.sensors == [] and cube.last_time is None
+
+
+@pytest.mark.parametrize(
+    "months, hours, day_types",
+    [(None, None, None), (7, range(0, 5), None), ([6, 7], 12, 1), (6, [22, 23, 0], 0)],
+)
+def test_lookup_matches_groupby(df, months, hours, day_types):
+    cube = DiurnalCube("temperature").update(df)
+    local = df.index.tz_convert(cube.tz)
+    keys = pd.DataFrame(
+        {"month": local.month, "hour": local.hour, "day_type": (local.dayofweek >= 5).astype(int)}, index=df.index
+    )
+    data = pd.concat([df, keys], axis=1).dropna(subset=["temperature"])
+    selected = data
+    for column, values in (("month", months), ("hour", hours), ("day_type", day_types)):
+        if values is not None:
+            selected = selected[selected[column].isin([values] if isinstance(values, int) else list(values))]
+
+    for device in DEVICES:
+        expected = selected.loc[selected["dev-id"] == device, "temperature"]
+        stats = cube.lookup(device[-4:], months, hours, day_types)
+        assert stats["count"] == len(expected)
+        assert stats["mean"] == pytest.approx(expected.mean())
+        assert stats["std"] == pytest.approx(expected.std(ddof=0))
+        # Percentiles are interpolated within the 0.5 degree bin of the ceil(q * n)th value
+        for q in (0.1, 0.5, 0.9):
+            value = np.sort(expected)[max(int(np.ceil(q * len(expected))), 1) - 1]
+            assert abs(stats[f"p{q * 100:g}"] - value) <= 0.5
+
+    groups = data.groupby(["dev-id", "month", "hour", "day_type"])["temperature"]
+    frame = cube.to_frame().set_index(["dev-id", "month", "hour", "day_type"]).sort_index()
+    frame.index = frame.index.set_levels(frame.index.levels[3].map({"weekday": 0, "weekend": 1}), level=3)
+    np.testing.assert_array_equal(frame["count"], groups.size().sort_index())
+    np.testing.assert_allclose(frame["mean"], groups.mean().sort_index())
@@ -0,0 +1,91 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fvhdata.utils.export import export_geojson, sensor_data, write_if_changed
+from fvhdata.utils.store import SensorStore
+
+
+DEVICES = ["24E124136E106616", "24E124136E106080"]
+
+
+def write_parquet(path, n=60, nanoseconds=0):
+    frames = []
+    for i, device in enumerate(DEVICES):
+        index = pd.date_range("2024-06-01", periods=n, freq="10min", tz="UTC")
+        # Readings are a few milliseconds (and nanoseconds) off the grid, as in the raw data
+        index = (index + pd.to_timedelta(np.arange(n) * 1_000_000 + nanoseconds, unit="ns")).rename("time")
+        frames.append(
+            pd.DataFrame({"dev-id": device, "humidity": 50.0 + i, "temperature": np.arange(n) / 10 + i}, index=index)
+        )
+    pd.concat(frames).to_parquet(path)
+    return path
+
+
+def write_metadata(path):
+    features = [
+        {"type": "Feature", "id": device, "geometry": None, "properties": {"name": device[-4:]}}
+        for device in DEVICES + ["24E124136E999999"]
+    ]
+    collection = {"type": "FeatureCollection", "meta": {"contact": "test"}, "features": features}
+    path.write_text(json.dumps(collection, indent=1))
+    return path
+
+
+def test_sensor_data(tmp_path):
+    store = SensorStore(write_parquet(tmp_path.joinpath("data.parquet")))
+    data = sensor_data(store)
+    assert list(data) == sorted(DEVICES)
+    entry = data["24E124136E106616"]
+    assert len(entry["data"]["raw"]) == 8
+    assert entry["data"]["raw"][-1]["temperature"] == 5.9
+    assert entry["data"]["raw"][-1]["time"] == "2024-06-01T09:50:00.059000+00:00"
+    assert entry["measurement"]["time"] == "2024-06-01T12:50:00.059000+03:00"
+    assert [len(entry["data"][name]) for name in ("h3", "d1")] == [4, 1]
+    assert entry["data"]["h3"][0] == {"time": "2024-06-01T00:00:00+00:00", "humidity": 50.0, "temperature": 0.85}
+
+
+def test_sensor_data_nanosecond_times(tmp_path):
+    store = SensorStore(write_parquet(tmp_path.joinpath("data.parquet"), nanoseconds=123))
+    entry = sensor_data(store, DEVICES[:1])[DEVICES[0]]
+    # Truncated to microseconds
+    assert entry["data"]["raw"][-1]["time"] == "2024-06-01T09:50:00.059000+00:00"
+
+
+def test_export_geojson(tmp_path):
+    store = SensorStore(write_parquet(tmp_path.joinpath("data.parquet")))
+    metadata = write_metadata(tmp_path.joinpath("test_latest.geojson"))
+    output_dir = tmp_path.joinpath("out")
+
+    written = export_geojson(store, [metadata], output_dir)
+    assert sorted(p.name for p in written) == sorted([f"{d}.geojson" for d in DEVICES] + ["test_latest.geojson"])
+    assert all(written.values())
+    collection = json.loads(output_dir.joinpath("test_latest.geojson").read_text())
+    assert collection["meta"]["contact"] == "test"
+    measurements = [f["properties"].get("measurement") for f in collection["features"]]
+    assert measurements[0]["temperature"] == 5.9
+    assert measurements[2] is None
+
+    # Only the creation time would change
+    assert not any(export_geojson(store, [metadata], output_dir).values())
+
+
+@pytest.mark.parametrize("old", [None, "abc", "abcdef", "xyz", "ab"])
+def test_write_if_changed(tmp_path, old):
+    path = tmp_path.joinpath("file.txt")
+    if old is not None:
+        path.write_text(old)
+    assert write_if_changed(path, ["ab", "c"]) == (old != "abc")
+    assert path.read_text() == "abc"
+    assert [p.name for p in tmp_path.iterdir()] == ["file.txt"]
+
+
+def test_write_if_changed_compare_from(tmp_path):
+    path = tmp_path.joinpath("file.txt")
+    assert write_if_changed(path, ["created 1|", "data"], compare_from="|")
+    assert not write_if_changed(path, ["created 2", "|data"], compare_from="|")
+    assert path.read_text() == "created 1|data"
+    assert write_if_changed(path, ["created 3|", "data2"], compare_from="|")
+    assert path.read_text() == "created 3|data2"
@@ -0,0 +1,180 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from fvhdata.utils.meteorology import derive
+from fvhdata.utils.store import SensorStore
+
+
+DEVICES = ["24E124136E106155", "24E124136E106080", "24E124136E101155"]
+
+
+@pytest.fixture(scope="module")
+def data(tmp_path_factory):
+    """Jittered 10-minute readings of three devices, interleaved and with gaps and NaNs."""
+    rng = np.random.default_rng(0)
+    frames = []
+    for i, device in enumerate(DEVICES):
+        n = 300 + 50 * i
+        start = pd.Timestamp("2024-06-01", tz="UTC") + pd.Timedelta(minutes=7 * i)
+        times = start + pd.to_timedelta(np.arange(n) * 600 + rng.integers(-30, 30, n), unit="s")
+        frame = pd.DataFrame(
+            {
+                "dev-id": device,
+                "humidity": np.round(rng.uniform(20, 100, n) * 2) / 2,
+                "temperature": np.round(rng.normal(15, 5, n), 1),
+            },
+            index=pd.DatetimeIndex(times, name="time"),
+        )
+        frame = frame.drop(frame.index[40:70])  # a gap of five hours
+        frame.iloc[::17, 2] = np.nan
+        frames.append(frame)
+    df = pd.concat(frames).sample(frac=1, random_state=1)
+    path = tmp_path_factory.mktemp("store").joinpath("data.parquet")
+    df.to_parquet(path)
+    return df, SensorStore(path)
+
+
+def utc(value):
+    """Naive times are UTC, like in the store."""
+    ts = pd.Timestamp(value)
+    return ts.tz_localize("UTC") if ts.tz is None else ts.tz_convert("UTC")
+
+
+def rows_of(df, device, start=None, end=None):
+    rows = df[df["dev-id"] == device].sort_index()
+    if start is not None:
+        rows = rows[rows.index >= utc(start)]
+    if end is not None:
+        rows = rows[rows.index < utc(end)]
+    return rows
+
+
+def resample(rows, resolution, columns):
+    # Fixed-length bins aligned to the epoch, like the store's integer binning
+    grouped = rows.resample(pd.Timedelta(resolution), origin="epoch")
+    expected = grouped[columns].mean()
+    expected["count"] = grouped.size()
+    expected.index = expected.index.as_unit("ns")
+    return expected[expected["count"] > 0]
+
+
+def as_frame(store, table):
+    frame = store.to_pandas(table)
+    frame.index = frame.index.as_unit("ns")
+    return frame
+
+
+def test_devices_and_resolve(data):
+    df, store = data
+    assert store.devices == sorted(DEVICES)
+    assert store.resolve("6155") == "24E124136E106155"
+    assert store.resolve("24E124136E101155") == "24E124136E101155"
+    for ambiguous_or_unknown in ("155", "9999"):
+        with pytest.raises(KeyError):
+            store.resolve(ambiguous_or_unknown)
+
+
+@pytest.mark.parametrize(
+    "start, end",
+    [
+        (None, None),
+        ("2024-06-01T05:00", "2024-06-02"),
+        ("2024-06-01T05:00:00+03:00", "2024-06-02T00:00:00+03:00"),
+        (pd.Timestamp("2024-06-01T02:00", tz="UTC"), pd.Timestamp("2024-06-01T12:00", tz="Europe/Helsinki")),
+        ("2024-06-01T10:00", "2024-06-01T10:00"),
+        ("2025-01-01", None),
+        (None, "2024-05-01"),
+    ],
+)
+def test_slice(data, start, end):
+    df, store = data
+    expected = rows_of(df, "24E124136E106155", start, end)[["humidity", "temperature"]]
+    result = as_frame(store, store.slice("6155", start, end))
+    assert len(result) == len(expected)
+    np.testing.assert_array_equal(result.index.asi8, expected.index.as_unit("ns").asi8)
+    np.testing.assert_array_equal(result.to_numpy(), expected.to_numpy())
+
+
+def test_slice_boundaries(data):
+    df, store = data
+    times = rows_of(df, "24E124136E106080").index
+    start, end = times[10], times[20]
+    result = store.slice("6080", start, end)
+    # [start, end): the reading at start is included, the one at end isn't
+    assert result.num_rows == 10
+    assert result.column("time")[0].as_py() == start.to_pydatetime()
+    assert store.slice("6080", start, start + pd.Timedelta(1, "ns")).num_rows == 1
+
+
+@pytest.mark.parametrize("resolution", ["10min", "1h", "3h", "1D"])
+def test_series_resampled(data, resolution):
+    df, store = data
+    start, end = "2024-06-01T03:30", "2024-06-03"
+    expected = resample(rows_of(df, DEVICES[1], start, end), resolution, ["temperature", "humidity"])
+    result = as_frame(store, store.series("6080", start, end, resolution, ["temperature", "humidity"]))
+    pd.testing.assert_frame_equal(result, expected, check_freq=False, check_names=False, check_dtype=False)
+
+
+def test_series_empty(data):
+    _, store = data
+    assert store.series("6080", "2025-01-01", None).num_rows == 0
+    table = store.series("6080", "2024-06-01T10:00", "2024-06-01T10:00", "1h", ["temperature"])
+    assert table.num_rows == 0
+    assert table.column_names == ["time", "temperature", "count"]
+
+
+def test_series_derived(data):
+    df, store = data
+    rows = rows_of(df, DEVICES[0], "2024-06-01", "2024-06-02").copy()
+    metrics = ["dew_point", "heat_index"]
+    for metric, values in derive(rows["temperature"], rows["humidity"], metrics).items():
+        rows[metric] = values.astype(np.float64)
+
+    raw = as_frame(store, store.series(DEVICES[0], "2024-06-01", "2024-06-02", columns=metrics))
+    np.testing.assert_allclose(raw[metrics].to_numpy(), rows[metrics].to_numpy(), rtol=1e-6)
+
+    result = as_frame(store, store.series(DEVICES[0], "2024-06-01", "2024-06-02", "1h", metrics))
+    expected = resample(rows, "1h", metrics)
+    pd.testing.assert_frame_equal(result, expected, check_freq=False, check_names=False, check_dtype=False, rtol=1e-6)
+
+
+def test_derived_only_columns(data):
+    _, store = data
+    assert store.slice("6080", columns=["dew_point"]).column_names == ["time", "dew_point"]
+    with pytest.raises(ValueError):
+        store.slice("6080", columns=["pressure"])
+
+
+@pytest.mark.parametrize("n", [1, 3, 1000])
+def test_latest(data, n):
+    df, store = data
+    devices = ["6080", "24E124136E101155"]
+    result = store.latest(n, devices, ["temperature"]).to_pandas()
+    expected = pd.concat([rows_of(df, store.resolve(d)).iloc[-n:] for d in devices])
+    assert result["dev-id"].tolist() == expected["dev-id"].tolist()
+    np.testing.assert_array_equal(result["time"].dt.as_unit("ns").to_numpy(), expected.index.as_unit("ns").to_numpy())
+    np.testing.assert_array_equal(result["temperature"].to_numpy(), expected["temperature"].to_numpy())
+
+
+@pytest.mark.parametrize("resolution, periods", [("3h", 14), ("1D", 4), ("1h", 1), ("10min", 500)])
+def test_rollup(data, resolution, periods):
+    df, store = data
+    result = store.rollup(resolution, periods, columns=["temperature", "humidity"]).to_pandas()
+    step = pd.Timedelta(resolution)
+    expected = []
+    for device in store.devices:
+        rows = rows_of(df, device)
+        first_bin = rows.index[-1].floor(step) - (periods - 1) * step
+        frame = resample(rows[rows.index >= first_bin], resolution, ["temperature", "humidity"])
+        expected.append(frame.assign(**{"dev-id": device}).reset_index())
+    expected = pd.concat(expected, ignore_index=True)[["dev-id", "time", "temperature", "humidity", "count"]]
+    expected["time"] = expected["time"].dt.as_unit("ns")
+    assert len(result) == len(expected)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_rollup_invalid(data):
+    _, store = data
+    with pytest.raises(ValueError):
+        store.rollup("1h", 0)